@@ -3,7 +3,9 @@ GreenCloud - Personal Cloud Storage with AI Agent and GreenOps
 Main Flask Application
 """
 
-from flask import Flask, render_template, redirect, url_for
+import hmac
+import ipaddress
+from flask import Flask, Response, abort, render_template, redirect, request, url_for
 from flask_login import current_user
 from config import Config
 from extensions import db, login_manager
@@ -20,46 +22,31 @@ def create_app():
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
     
+    # Per-request resource accounting
+    from services.request_metrics import request_metrics
+    from services.system_monitor import system_monitor
+    request_metrics.init_app(app)
+    system_monitor.init_app(app)
+    
+    # On-demand profiler, idle until an admin starts a session
+    from services.profiler import sampling_profiler
+    sampling_profiler.init_app(app)
+    
+    # Schema creation and seeding run once per deployment (init_db.py, the
+    # `flask init-db` command or gunicorn's on_starting hook), not per worker
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create missing tables and indexes and seed the default users"""
+        from init_db import init_database
+        init_database(app)
+    
     with app.app_context():
-        # Import models
-        from models.user import User
-        from models.file import File
-        from models.folder import Folder
-        
-        # Create tables
-        db.create_all()
-        
-        # Create default admin user if not exists (for production)
-        admin = User.query.filter_by(email='admin@greencloud.local').first()
-        if not admin:
-            print("Creating default admin user...")
-            admin = User(
-                username='admin',
-                email='admin@greencloud.local',
-                first_name='Admin',
-                last_name='User',
-                is_admin=True
-            )
-            admin.set_password('admin123')
-            db.session.add(admin)
-            
-            # Create demo user
-            demo = User(
-                username='demo',
-                email='demo@greencloud.local',
-                first_name='Demo',
-                last_name='User'
-            )
-            demo.set_password('demo123')
-            db.session.add(demo)
-            
-            db.session.commit()
-            print("Default users created: admin@greencloud.local / demo@greencloud.local")
-        
         # Register user loader
+        from services.user_cache import user_cache
+        
         @login_manager.user_loader
         def load_user(user_id):
-            return User.query.get(int(user_id))
+            return user_cache.load(int(user_id))
         
         # Register blueprints
         from routes.auth import auth_bp
@@ -75,6 +62,32 @@ def create_app():
         app.register_blueprint(ai_bp, url_prefix='/ai')
         app.register_blueprint(greenops_bp, url_prefix='/greenops')
         app.register_blueprint(system_bp, url_prefix='/system')
+        
+        # Background maintenance jobs
+        from services.scheduler import scheduler
+        from services.greenops import GreenOpsService
+        from services.deletion import deletion_service
+        from services.file_service import FileService
+        
+        scheduler.add_job('auto_cleanup', GreenOpsService.purge_expired_trash,
+                          interval=Config.AUTO_CLEANUP_INTERVAL_MINUTES * 60, delay=60, priority='low')
+        scheduler.add_job('deletion_retry', deletion_service.retry_pending,
+                          interval=Config.DELETION_RETRY_MINUTES * 60, priority='low')
+        scheduler.add_job('hash_backlog', FileService.hash_backlog, interval=60, priority='low')
+        
+        from services.suggestions import suggestion_service
+        scheduler.add_job('suggestions', suggestion_service.refresh_all,
+                          interval=Config.SUGGESTIONS_REFRESH_MINUTES * 60, delay=30, priority='low')
+        
+        from services.cache import panel_cache
+        scheduler.add_job('cache_purge', panel_cache.purge_expired, interval=3600, priority='low')
+        
+        if Config.HISTORY_PERSIST:
+            from services.metrics_history import metrics_history
+            metrics_history.load()
+            scheduler.add_job('history_persist', metrics_history.persist,
+                              interval=Config.HISTORY_PERSIST_MINUTES * 60)
+        scheduler.init_app(app)
     
     # Main routes
     @app.route('/')
@@ -83,12 +96,26 @@ def create_app():
             return redirect(url_for('dashboard'))
         return redirect(url_for('auth.login'))
     
+    @app.route('/metrics')
+    def metrics():
+        """Expose metrics for Prometheus-compatible scrapers"""
+        from services.metrics_export import metrics_exporter, CONTENT_TYPE
+        
+        if Config.METRICS_TOKEN:
+            if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {Config.METRICS_TOKEN}'):
+                abort(401)
+        elif not _is_loopback(request.remote_addr) and not (current_user.is_authenticated and current_user.is_admin):
+            # Without a token, only local scrapers and admins may read it
+            abort(403)
+        return Response(metrics_exporter.render(), content_type=CONTENT_TYPE)
+    
     @app.route('/dashboard')
     def dashboard():
         from flask_login import login_required
         from services.file_service import FileService
         from services.greenops import GreenOpsService
         from services.system_monitor import system_monitor
+        from services.cache import panel_cache, user_scope, GLOBAL_SCOPE
         from models.user import User
         from models.file import File
         
@@ -131,15 +158,27 @@ def create_app():
                     'eco_mode_enabled': current_user.eco_mode_enabled
                 })
                 
-                stats = {
+                # File-derived panels change only on file/folder mutations,
+                # which invalidate these cache scopes
+                panels = panel_cache.get_or_compute(user_scope(current_user.id), 'dashboard', lambda: {
                     'total_files': file_service.get_file_count(),
                     'total_folders': file_service.get_folder_count(),
+                    'greenops_score': greenops_service.calculate_greenops_score(),
+                    'suggestions': greenops_service.get_suggestions()
+                })
+                recent_files = panel_cache.get_or_compute(
+                    GLOBAL_SCOPE, 'recent_files', lambda: file_service.get_recent_files_summary(limit=5)
+                )
+                
+                stats = {
+                    'total_files': panels['total_files'],
+                    'total_folders': panels['total_folders'],
                     'storage_used': file_service.get_storage_used(),
                     'storage_quota': current_user.storage_quota,
                     'storage_percentage': file_service.get_storage_percentage(),
-                    'recent_files': file_service.get_recent_files(limit=5),
-                    'greenops_score': greenops_service.calculate_greenops_score(),
-                    'suggestions': greenops_service.get_suggestions(),
+                    'recent_files': recent_files,
+                    'greenops_score': panels['greenops_score'],
+                    'suggestions': panels['suggestions'],
                     'system': system_stats,
                     'energy_score': energy_score
                 }
@@ -167,10 +206,20 @@ def create_app():
     
     return app
 
+def _is_loopback(address):
+    """Check whether a request came from this host"""
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return False
+
 # Create app instance
 app = create_app()
 
 if __name__ == '__main__':
+    from init_db import init_database
+    init_database(app)
+    
     # Use ASCII-only console output for better Windows compatibility
     print("GreenCloud Starting...")
     print("Server running at: http://localhost:5000")
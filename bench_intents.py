@@ -0,0 +1,125 @@
+"""
+Check and benchmark the AI agent's intent matcher
+Run this after changing services/intent_matcher.py; it exits non-zero
+if any labeled message is routed to the wrong intent
+"""
+
+import sys
+import timeit
+from services.intent_matcher import intent_matcher
+
+# Labeled regression corpus: (message, expected intent or None for the default reply)
+CORPUS = [
+    ('system resources', 'system'),
+    ('what is my cpu usage', 'system'),
+    ('how much memory is the server using', 'system'),
+    ('is the ram full', 'system'),
+    ('how is performance right now', 'system'),
+    ('energy', 'energy'),
+    ("what's my energy score", 'energy'),
+    ('battery level', 'energy'),
+    ('how much power are we drawing', 'energy'),
+    ('what is eating my space', 'breakdown'),
+    ('show me a breakdown of file types', 'breakdown'),
+    ('which are my biggest files', 'breakdown'),
+    ('what is taking up my storage', 'breakdown'),
+    ('largest files', 'breakdown'),
+    ('storage', 'storage'),
+    ('how much space do i have left', 'storage'),
+    ("what's my quota", 'storage'),
+    ('how much storage have i used', 'storage'),
+    ('how many files use storage', 'file_count'),
+    ('how many files do i have', 'file_count'),
+    ('file count', 'file_count'),
+    ('number of files in my account', 'file_count'),
+    ('cleanup', 'cleanup'),
+    ('help me clean up', 'cleanup'),
+    ('optimize my account', 'cleanup'),
+    ('how can i free space', 'cleanup'),
+    ('free up some storage', 'cleanup'),
+    ('duplicates', 'duplicate'),
+    ('do i have the same files twice', 'duplicate'),
+    ('clean up duplicate files', 'duplicate'),
+    ('find duplicate photos taking space', 'duplicate'),
+    ('greenops', 'greenops'),
+    ('what is greenops', 'greenops'),
+    ('how is this sustainable', 'greenops'),
+    ('tell me about eco mode', 'greenops'),
+    ('help', 'help'),
+    ('what can you do', 'help'),
+    ('upload', 'upload'),
+    ('how to upload a file', 'upload'),
+    ('how do i add files', 'upload'),
+    ('organize', 'organize'),
+    ('how to manage my folders', 'organize'),
+    ('create a new folder', 'organize'),
+    ('recent files', 'recent'),
+    ('what are my latest uploads', 'recent'),
+    ("what's new", 'recent'),
+    ('where is my tax pdf from March', 'find'),
+    ('find my holiday photos', 'find'),
+    ('search for the invoice spreadsheet', 'find'),
+    ('where did i put the project proposal', 'find'),
+    # Substrings inside other words must not match
+    ('my program crashed', None),
+    ('renew subscription', None),
+    ('second opinion', None),
+    ('hello there', None),
+    ('', None),
+]
+
+
+def legacy_match(message):
+    """The keyword cascade AIAgent.process_message used before the matcher"""
+    message = message.lower().strip()
+    for intent, words in (
+        ('system', ['cpu', 'memory', 'ram', 'system', 'resources', 'performance']),
+        ('energy', ['energy', 'battery', 'power', 'energy score']),
+        ('breakdown', ['eating', 'breakdown', 'file types', 'biggest', 'largest', 'taking up']),
+        ('storage', ['storage', 'space', 'quota', 'how much']),
+        ('file_count', ['how many files', 'file count', 'number of files']),
+        ('cleanup', ['cleanup', 'clean', 'optimize', 'free space']),
+        ('duplicate', ['duplicate', 'duplicates', 'same files']),
+        ('greenops', ['greenops', 'green', 'eco', 'sustainable']),
+        ('help', ['help', 'how to', 'what can you do']),
+        ('upload', ['upload', 'add file']),
+        ('organize', ['organize', 'manage', 'folder']),
+        ('recent', ['recent', 'latest', 'new']),
+    ):
+        if any(word in message for word in words):
+            return intent
+    return None
+
+
+def check(name, match):
+    """Print and count the corpus messages routed to the wrong intent"""
+    failures = [(message, expected, match(message)) for message, expected in CORPUS
+                if match(message) != expected]
+    print(f"{name}: {len(CORPUS) - len(failures)}/{len(CORPUS)} correct")
+    for message, expected, got in failures:
+        print(f"  {message!r}: expected {expected}, got {got}")
+    return len(failures)
+
+
+def bench(name, match, rounds=200):
+    """Print the mean time to route one corpus message"""
+    messages = [message for message, _ in CORPUS]
+    seconds = min(timeit.repeat(lambda: [match(message) for message in messages], number=rounds, repeat=5))
+    print(f"{name}: {seconds / (rounds * len(messages)) * 1e6:.2f} us/message")
+
+
+if __name__ == '__main__':
+    print("\n" + "="*50)
+    print("GreenCloud - Intent Matcher")
+    print("="*50)
+    check('legacy cascade', legacy_match)
+    failures = check('intent matcher', intent_matcher.match)
+
+    print()
+    bench('legacy cascade', legacy_match)
+    bench('intent matcher', intent_matcher.match)
+    long_message = ' '.join(message for message, _ in CORPUS)
+    seconds = min(timeit.repeat(lambda: intent_matcher.scores(long_message), number=200, repeat=5)) / 200
+    print(f"intent matcher, {len(long_message)} chars: {seconds * 1e6:.1f} us")
+
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,232 @@
+"""
+Benchmark concurrent large transfers against a running GreenCloud server
+Start the server with the worker profile to measure, for example
+    GUNICORN_PROFILE=sync gunicorn app:app --config gunicorn_config.py
+    GUNICORN_PROFILE=gthread gunicorn app:app --config gunicorn_config.py
+then run `python bench_transfers.py --url http://127.0.0.1:10000`.
+Slow clients upload and then download files at a capped rate while a probe
+times a light page; the uploaded files are deleted afterwards.
+"""
+
+import argparse
+import http.client
+import re
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+CHUNK = 64 * 1024
+
+
+class Client:
+    """Minimal HTTP client that keeps the session cookie"""
+
+    def __init__(self, url, timeout=600):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self.cookies = {}
+
+    def connect(self):
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        conn = self.connect()
+        try:
+            conn.request(method, path, body=body, headers=self._headers(headers))
+            response = conn.getresponse()
+            data = response.read()
+            self._keep_cookies(response)
+            return response.status, data
+        finally:
+            conn.close()
+
+    def login(self, email, password):
+        status, _ = self.request('POST', '/auth/login', urlencode({'email': email, 'password': password}),
+                                 {'Content-Type': 'application/x-www-form-urlencoded'})
+        if status != 302 or 'session' not in self.cookies:
+            raise SystemExit(f'Login failed for {email} (HTTP {status})')
+
+    def upload(self, name, size, rate):
+        """Send a multipart upload of `size` bytes at most `rate` bytes per second"""
+        boundary = uuid.uuid4().hex
+        head = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{name}"\r\n'
+                'Content-Type: application/octet-stream\r\n\r\n').encode()
+        tail = f'\r\n--{boundary}--\r\n'.encode()
+        conn = self.connect()
+        try:
+            conn.putrequest('POST', '/files/upload')
+            for key, value in self._headers({
+                'Content-Type': f'multipart/form-data; boundary={boundary}',
+                'Content-Length': str(len(head) + size + len(tail))
+            }).items():
+                conn.putheader(key, value)
+            conn.endheaders()
+            conn.send(head)
+            _throttle(size, rate, lambda n: conn.send(b'\0' * n) or n)
+            conn.send(tail)
+            response = conn.getresponse()
+            response.read()
+            self._keep_cookies(response)
+            return response.status == 302
+        finally:
+            conn.close()
+
+    def download(self, file_id, size, rate):
+        """Read a download at most `rate` bytes per second"""
+        conn = self.connect()
+        try:
+            conn.request('GET', f'/files/{file_id}/download', headers=self._headers())
+            response = conn.getresponse()
+            if response.status != 200:
+                return False
+            received = _throttle(size, rate, lambda n: len(response.read(n)))
+            response.read()
+            return received == size
+        finally:
+            conn.close()
+
+    def _headers(self, headers=None):
+        headers = dict(headers or {})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{key}={value}' for key, value in self.cookies.items())
+        return headers
+
+    def _keep_cookies(self, response):
+        for header in response.msg.get_all('Set-Cookie') or []:
+            key, _, value = header.split(';', 1)[0].partition('=')
+            self.cookies[key.strip()] = value
+
+
+class Probe(threading.Thread):
+    """Time a light page in a loop until stopped"""
+
+    def __init__(self, url, path='/auth/login'):
+        super().__init__(daemon=True)
+        self.client = Client(url, timeout=120)
+        self.path = path
+        self.latencies = []
+        self.errors = 0
+        self.stop = threading.Event()
+
+    def run(self):
+        while not self.stop.is_set():
+            start = time.perf_counter()
+            try:
+                status, _ = self.client.request('GET', self.path)
+                if status == 200:
+                    self.latencies.append(time.perf_counter() - start)
+                else:
+                    self.errors += 1
+            except OSError:
+                self.errors += 1
+            self.stop.wait(0.2)
+
+    def summary(self):
+        if not self.latencies:
+            return f'probe: no answers, {self.errors} errors'
+        latencies = sorted(self.latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return (f'probe: {len(latencies)} answers, p50 {statistics.median(latencies) * 1000:.0f} ms, '
+                f'p95 {p95 * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms, {self.errors} errors')
+
+
+def _throttle(size, rate, transfer):
+    """Move `size` bytes in chunks, sleeping to stay under `rate` bytes per second"""
+    start = time.perf_counter()
+    moved = 0
+    while moved < size:
+        count = transfer(min(CHUNK, size - moved))
+        if not count:
+            break
+        moved += count
+        ahead = moved / rate - (time.perf_counter() - start)
+        if ahead > 0:
+            time.sleep(ahead)
+    return moved
+
+
+def run_phase(url, clients, job):
+    """Run `job(index)` for every client at once, with the probe running"""
+    probe = Probe(url)
+    probe.start()
+    durations = []
+
+    def timed(index):
+        start = time.perf_counter()
+        try:
+            ok = job(index)
+        except OSError:
+            ok = False
+        durations.append(time.perf_counter() - start)
+        return ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(timed, range(clients)))
+    wall = time.perf_counter() - start
+    probe.stop.set()
+    probe.join()
+    return wall, results, durations, probe
+
+
+def report(name, clients, size, wall, results, durations, probe):
+    done = sum(results)
+    print(f"{name}: {done}/{clients} ok in {wall:.1f} s, "
+          f"{done * size / (1024**2) / wall:.1f} MB/s, "
+          f"transfer mean {statistics.mean(durations):.1f} s, max {max(durations):.1f} s")
+    print(f"  {probe.summary()}")
+
+
+def file_ids(client, prefix):
+    """Map the benchmark's file names to ids from the file list"""
+    _, page = client.request('GET', '/files/')
+    page = page.decode('utf-8', 'replace')
+    ids = {}
+    for match in re.finditer(re.escape(prefix) + r'[\w.-]*', page):
+        link = re.search(r'/files/(\d+)/download', page[match.end():])
+        if link:
+            ids.setdefault(match.group(0), int(link.group(1)))
+    return ids
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:10000')
+    parser.add_argument('--email', default='admin@greencloud.local')
+    parser.add_argument('--password', default='admin123')
+    parser.add_argument('--clients', type=int, default=32, help='concurrent slow clients')
+    parser.add_argument('--size-mb', type=float, default=8, help='size of each transfer')
+    parser.add_argument('--rate-kb', type=float, default=1024, help='per-client transfer rate in KB/s')
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024**2)
+    rate = args.rate_kb * 1024
+    prefix = f'bench-{uuid.uuid4().hex[:8]}-'
+    client = Client(args.url)
+    client.login(args.email, args.password)
+
+    print("\n" + "="*50)
+    print("GreenCloud - Transfer Benchmark")
+    print("="*50)
+    print(f"{args.clients} clients x {args.size_mb:g} MB at {args.rate_kb:g} KB/s each")
+
+    try:
+        report('upload', args.clients, size, *run_phase(
+            args.url, args.clients,
+            lambda index: client.upload(f'{prefix}{index}.zip', size, rate)
+        ))
+
+        ids = list(file_ids(client, prefix).values())
+        if not ids:
+            raise SystemExit('Uploaded files not found in the file list')
+        report('download', args.clients, size, *run_phase(
+            args.url, args.clients,
+            lambda index: client.download(ids[index % len(ids)], size, rate)
+        ))
+    finally:
+        for file_id in file_ids(client, prefix).values():
+            client.request('POST', f'/files/{file_id}/delete-permanent')
@@ -14,10 +14,15 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         f'sqlite:///{os.path.join(BASE_DIR, "database", "greencloud.db")}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),  # Raised to one per thread for gthread workers
+        'max_overflow': 10
+    }
     
     # Upload configuration
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
     MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB max file size
+    IO_CHUNK_SIZE = 1024 * 1024  # Bytes per read/write when saving or hashing files
     ALLOWED_EXTENSIONS = {
         'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 
         'xls', 'xlsx', 'ppt', 'pptx', 'zip', 'rar', 'mp3', 'mp4',
@@ -29,6 +34,14 @@ class Config:
     SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
+    USER_CACHE_SIZE = 1024  # Logged in users cached per worker
+    USER_CACHE_TTL = 30  # Seconds before a cached user is reloaded even if unchanged
+    
+    # Password hashing (Werkzeug method string; changing it rehashes passwords on next login)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))  # Hashes computed at once per worker
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 4))  # Hashes allowed to wait; more are rejected
+    PASSWORD_HASH_TIMEOUT = 10  # Seconds a request waits for its hash before giving up
     
     # Storage quota (in bytes)
     DEFAULT_STORAGE_QUOTA = 5 * 1024 * 1024 * 1024  # 5GB per user
@@ -36,10 +49,75 @@ class Config:
     # GreenOps configuration
     GREENOPS_ENABLED = True
     AUTO_CLEANUP_DAYS = 30  # Days before trash auto-cleanup
+    AUTO_CLEANUP_INTERVAL_MINUTES = int(os.environ.get('AUTO_CLEANUP_INTERVAL_MINUTES', 60))
+    
+    # Permanent deletion
+    DELETION_BATCH_SIZE = 500  # Rows per DELETE statement
+    DELETION_WORKERS = 4  # Parallel file removals
+    DELETION_MAX_ATTEMPTS = 5  # Retries for files that could not be removed
+    DELETION_RETRY_MINUTES = 10
     SESSION_TIMEOUT_MINUTES = 30  # Auto-logout after inactivity
     DUPLICATE_FILE_CHECK = True
     VERSION_RETENTION_DAYS = 90
     
+    # System monitor sampling
+    METRICS_SAMPLE_INTERVAL = 5  # Seconds between background samples
+    METRICS_SHM_DIR = os.environ.get('METRICS_SHM_DIR')  # Defaults to /dev/shm or the temp dir
+    HISTORY_RAW_POINTS = 720  # Raw samples kept (1 hour at 5s)
+    HISTORY_MINUTE_POINTS = 1440  # 1 minute rollups kept (24 hours)
+    HISTORY_HOUR_POINTS = 720  # 1 hour rollups kept (30 days)
+    HISTORY_PERSIST = os.environ.get('HISTORY_PERSIST', 'true').lower() == 'true'
+    HISTORY_PERSIST_MINUTES = 5
+    HISTORY_PATH = os.environ.get('HISTORY_PATH') or os.path.join(BASE_DIR, 'database', 'metrics.db')
+    
+    # Upload and database volume monitoring
+    DISK_GROWTH_WINDOW_MINUTES = 60  # Recent growth used to project time-to-full
+    DISK_FULL_ALERT_HOURS = 24  # Alert when a volume is projected to fill sooner than this
+    
+    # Per-request energy accounting
+    REQUEST_METRICS_WINDOW_MINUTES = 60  # Rolling window kept in memory
+    ENERGY_CPU_WATTS = 15.0  # Estimated draw of one busy core
+    ENERGY_JOULES_PER_MB = 0.05  # Estimated cost of moving 1 MB to or from disk
+    
+    # Slow query log
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 100))  # Statements slower than this are logged
+    SLOW_QUERY_LIMIT = 50  # Distinct slow statements kept per worker
+    
+    # Live stats stream (Server-Sent Events)
+    SSE_MAX_SUBSCRIBERS = int(os.environ.get('SSE_MAX_SUBSCRIBERS', 20))  # Open streams per worker
+    SSE_MAX_SECONDS = int(os.environ.get('SSE_MAX_SECONDS', 300))  # Streams end and reconnect after this
+    SSE_HEARTBEAT_SECONDS = 15  # Keepalive comment when nothing changed
+    
+    # OpenMetrics endpoint (/metrics)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Bearer token required to scrape; if unset, only localhost and admins
+    METRICS_FLUSH_SECONDS = 10  # How often each worker writes its counters for other workers
+    
+    # On-demand sampling profiler
+    PROFILER_MAX_SECONDS = 60  # Longest session an admin can start
+    PROFILER_INTERVAL_MS = 10  # Time between stack samples while a session runs
+    PROFILER_POLL_SECONDS = 1  # How often idle workers check for a new session
+    
+    # Panel cache shared by all workers (SQLite file next to the database)
+    CACHE_PATH = os.environ.get('CACHE_PATH') or os.path.join(BASE_DIR, 'database', 'cache.db')
+    CACHE_DEFAULT_TTL = 300  # Seconds before a cached panel is recomputed anyway
+    
+    # File search index used by the AI agent (SQLite file next to the database)
+    SEARCH_INDEX_PATH = os.environ.get('SEARCH_INDEX_PATH') or os.path.join(BASE_DIR, 'database', 'search.db')
+    SEARCH_INDEX_MMAP_MB = 64  # Part of the index file read through a memory map
+    SEARCH_RESULTS = 5  # Files listed in a search answer
+    
+    # Background scheduler (periodic maintenance jobs)
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true'
+    SCHEDULER_WORKERS = 2  # Jobs that may run at the same time
+    SCHEDULER_NICE = 10  # CPU niceness of job threads (Linux)
+    SCHEDULER_MAX_DEFER_MINUTES = 360  # Low priority jobs run after waiting this long, whatever the load
+    # Only the worker holding this lock runs jobs; another takes over when it exits
+    SCHEDULER_LOCK_PATH = os.environ.get('SCHEDULER_LOCK_PATH') or os.path.join(BASE_DIR, 'database', 'scheduler.lock')
+    HASH_BATCH_SIZE = 50  # Uploads hashed per run of the hash backlog job
+    HASH_MAX_ATTEMPTS = 3  # Unreadable uploads are skipped after this many failed runs
+    HASH_INLINE_MAX_SIZE = 4 * 1024 * 1024  # Smaller uploads are hashed at once; larger ones by the job
+    SUGGESTIONS_REFRESH_MINUTES = 15  # How often every user's suggestions are recomputed
+    
     # AI Agent configuration
     AI_AGENT_ENABLED = False
     AI_AGENT_NAME = "GreenBot"
@@ -3,19 +3,36 @@ Gunicorn configuration for production deployment
 """
 import multiprocessing
 import os
+import sys
 
 # Server socket
 port = os.environ.get("PORT", "10000")
 bind = f"0.0.0.0:{port}"  # Render uses port 10000
 backlog = 2048
 
-# Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = 'sync'
-worker_connections = 1000
+# Worker processes (GUNICORN_PROFILE)
+#   gthread: a few processes with GUNICORN_THREADS threads each, so a long
+#            upload or download holds one thread instead of a whole process
+#   sync:    one request at a time per process
+worker_profile = os.environ.get('GUNICORN_PROFILE', 'gthread')
+if worker_profile == 'gthread':
+    workers = multiprocessing.cpu_count() + 1
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 32))
+    # One pooled database connection per request thread
+    os.environ.setdefault('DB_POOL_SIZE', str(threads))
+elif worker_profile == 'sync':
+    workers = multiprocessing.cpu_count() * 2 + 1
+    worker_class = 'sync'
+else:
+    raise ValueError(f'Unknown GUNICORN_PROFILE: {worker_profile}')
+worker_connections = 1000  # gthread: open connections per worker, idle keep-alive included
 timeout = 30
 keepalive = 2
 
+# Import the app once in the master so workers share its memory copy-on-write
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
 # Logging
 accesslog = '-'
 errorlog = '-'
@@ -35,3 +52,38 @@ tmp_upload_dir = None
 # SSL
 keyfile = None
 certfile = None
+
+
+# Server hooks
+def on_starting(server):
+    """Create the shared metrics segment and the database before any worker is forked"""
+    from services.shared_metrics import create_segment
+    create_segment(os.getpid())
+    
+    from init_db import init_database
+    init_database()
+
+
+def post_fork(server, worker):
+    """Drop database connections inherited from a preloaded master"""
+    if 'app' not in sys.modules:
+        return
+    from app import app
+    from extensions import db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    """Start this worker's sampler and background jobs before it takes requests"""
+    from services.system_monitor import system_monitor
+    from services.scheduler import scheduler
+    system_monitor.start()
+    scheduler.ensure_running()
+
+
+def on_exit(server):
+    """Remove the shared metrics segment"""
+    from services.shared_metrics import remove_segment
+    remove_segment()
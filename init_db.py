@@ -1,73 +1,79 @@
 """
 Database initialization script
-Run this to create the database and tables
+Run this (or `flask --app app init-db`) to create the database and tables.
+Gunicorn runs it once in the master before any worker is forked.
 """
 
-from app import app
+from flask import Flask
+from sqlalchemy.exc import IntegrityError
+from config import Config
 from extensions import db
-from models.user import User
-from models.file import File
-from models.folder import Folder
 
-def init_database():
-    """Initialize database with tables"""
+# Seeded accounts: (username, email, password, first name, last name, is admin)
+DEFAULT_USERS = [
+    ('admin', 'admin@greencloud.local', 'admin123', 'Admin', 'User', True),
+    ('demo', 'demo@greencloud.local', 'demo123', 'Demo', 'User', False),
+]
+
+
+def create_database_app():
+    """Minimal app for database setup, without blueprints or background services"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    Config.init_app(app)
+    db.init_app(app)
+    return app
+
+
+def init_database(app=None):
+    """Create missing tables and indexes and seed the default users"""
+    own_app = app is None
+    if own_app:
+        app = create_database_app()
+    
     with app.app_context():
-        # Create all tables
-        print("Creating database tables...")
+        # Importing the package registers every table
+        from models import User, File
+        
         db.create_all()
-        # Use ASCII-only output for Windows consoles
-        print("Database tables created successfully!")
         
-        # Create admin user if not exists
-        admin = User.query.filter_by(email='admin@greencloud.local').first()
-        if not admin:
-            print("\nCreating admin user...")
-            admin = User(
-                username='admin',
-                email='admin@greencloud.local',
-                first_name='Admin',
-                last_name='User',
-                is_admin=True
-            )
-            admin.set_password('admin123')
-            
-            db.session.add(admin)
-            db.session.commit()
-            
-            print("Admin user created successfully!")
-            print("   Email: admin@greencloud.local")
-            print("   Password: admin123")
-        else:
-            print("\nAdmin user already exists!")
+        # create_all() skips existing tables, so add indexes introduced later
+        for index in File.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
         
-        # Create demo user
-        demo = User.query.filter_by(email='demo@greencloud.local').first()
-        if not demo:
-            print("\nCreating demo user...")
-            demo = User(
-                username='demo',
-                email='demo@greencloud.local',
-                first_name='Demo',
-                last_name='User'
+        for username, email, password, first_name, last_name, is_admin in DEFAULT_USERS:
+            if User.query.filter_by(email=email).first():
+                continue
+            user = User(
+                username=username,
+                email=email,
+                first_name=first_name,
+                last_name=last_name,
+                is_admin=is_admin
             )
-            demo.set_password('demo123')
-            
-            db.session.add(demo)
-            db.session.commit()
-            
-            print("Demo user created successfully!")
-            print("   Email: demo@greencloud.local")
-            print("   Password: demo123")
-        else:
-            print("Demo user already exists!")
+            user.set_password(password)
+            db.session.add(user)
+            try:
+                db.session.commit()
+                print(f"Default user created: {email} / {password}")
+            except IntegrityError:
+                # Another process seeded it first
+                db.session.rollback()
         
-        print("\n========================================")
-        print("GreenCloud database is ready!")
-        print("========================================")
-        print("\nLogin with:")
-        print("  Admin: admin@greencloud.local / admin123")
-        print("  Demo:  demo@greencloud.local / demo123")
-        print("========================================\n")
+        if own_app:
+            # Leave no connections behind for forked workers to inherit
+            db.session.remove()
+            db.engine.dispose()
+
 
 if __name__ == '__main__':
+    print("Creating database tables...")
     init_database()
+    
+    print("\n========================================")
+    print("GreenCloud database is ready!")
+    print("========================================")
+    print("\nLogin with:")
+    print("  Admin: admin@greencloud.local / admin123")
+    print("  Demo:  demo@greencloud.local / demo123")
+    print("========================================\n")
@@ -3,5 +3,8 @@
 from models.user import User
 from models.file import File
 from models.folder import Folder
+from models.pending_deletion import PendingDeletion
+from models.hash_failure import HashFailure
+from models.user_suggestions import UserSuggestions
 
-__all__ = ['User', 'File', 'Folder']
+__all__ = ['User', 'File', 'Folder', 'PendingDeletion', 'HashFailure', 'UserSuggestions']
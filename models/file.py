@@ -9,6 +9,10 @@ class File(db.Model):
     """File model for uploaded files"""
     
     __tablename__ = 'files'
+    __table_args__ = (
+        # Trash expiry scans for the auto cleanup purge
+        db.Index('ix_files_is_deleted_deleted_at', 'is_deleted', 'deleted_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
@@ -114,16 +118,8 @@ class File(db.Model):
     
     def hard_delete(self):
         """Permanently delete file from database and storage"""
-        # Delete physical file
-        try:
-            if os.path.exists(self.file_path):
-                os.remove(self.file_path)
-        except Exception as e:
-            print(f"Error deleting file: {e}")
-        
-        # Delete from database
-        db.session.delete(self)
-        db.session.commit()
+        from services.deletion import deletion_service
+        deletion_service.hard_delete([self.id])
     
     def update_access_time(self):
         """Update last accessed timestamp"""
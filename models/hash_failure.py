@@ -0,0 +1,21 @@
+"""Hash failure model"""
+
+from datetime import datetime
+from extensions import db
+
+
+class HashFailure(db.Model):
+    """Upload the hash backlog job could not read, retried a few times"""
+
+    __tablename__ = 'hash_failures'
+
+    # Not a foreign key: bulk file deletion leaves these rows behind harmlessly
+    file_id = db.Column(db.Integer, primary_key=True)
+
+    # Retry bookkeeping
+    attempts = db.Column(db.Integer, default=1)
+    last_error = db.Column(db.Text)
+    last_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<HashFailure {self.file_id}>'
@@ -0,0 +1,24 @@
+"""Pending deletion model"""
+
+from datetime import datetime
+from extensions import db
+
+
+class PendingDeletion(db.Model):
+    """Physical file whose removal failed and should be retried"""
+
+    __tablename__ = 'pending_deletions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    file_path = db.Column(db.String(500), nullable=False)
+
+    # Retry bookkeeping
+    attempts = db.Column(db.Integer, default=1)
+    last_error = db.Column(db.Text)
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<PendingDeletion {self.file_path}>'
@@ -2,7 +2,6 @@
 
 from datetime import datetime
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from config import Config
 from extensions import db
 
@@ -43,11 +42,18 @@ class User(UserMixin, db.Model):
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = generate_password_hash(password)
+        from services.password_hasher import password_hasher
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
         """Verify password"""
-        return check_password_hash(self.password_hash, password)
+        from services.password_hasher import password_hasher
+        return password_hasher.verify(self.password_hash, password)
+    
+    def needs_rehash(self):
+        """Check whether the password was hashed with outdated parameters"""
+        from services.password_hasher import password_hasher
+        return password_hasher.needs_rehash(self.password_hash)
     
     def get_storage_percentage(self):
         """Calculate storage usage percentage"""
@@ -0,0 +1,22 @@
+"""User suggestions model"""
+
+from datetime import datetime
+from extensions import db
+
+
+class UserSuggestions(db.Model):
+    """Suggestions precomputed for one user by the suggestions batch job"""
+
+    __tablename__ = 'user_suggestions'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+
+    # Lists of messages, as returned by GreenOpsService.get_suggestions
+    # and AIAgent.get_smart_suggestions
+    greenops = db.Column(db.JSON, nullable=False, default=list)
+    smart = db.Column(db.JSON, nullable=False, default=list)
+
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<UserSuggestions {self.user_id}>'
@@ -1,6 +1,7 @@
 """AI Agent routes"""
 
-from flask import Blueprint, jsonify, request
+import json
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from flask_login import login_required, current_user
 from services.ai_agent import AIAgent
 
@@ -10,7 +11,11 @@ ai_bp = Blueprint('ai', __name__)
 @ai_bp.route('/chat', methods=['POST'])
 @login_required
 def chat():
-    """Handle AI agent chat messages"""
+    """Handle AI agent chat messages
+    
+    Clients that accept application/x-ndjson get the answer as one JSON
+    object per line: sections as they are ready, then the final data.
+    """
     data = request.get_json()
     message = data.get('message', '').strip().lower()
     
@@ -18,6 +23,14 @@ def chat():
         return jsonify({'error': 'Message is required'}), 400
     
     agent = AIAgent(current_user.id)
+    
+    if request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson':
+        lines = (json.dumps(item, default=str) + '\n' for item in agent.stream_message(message))
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+    
     response = agent.process_message(message)
     
     return jsonify({
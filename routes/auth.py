@@ -7,6 +7,8 @@ from functools import wraps
 from flask import abort
 from extensions import db
 from models.user import User
+from services.deletion import deletion_service
+from services.password_hasher import PasswordHasherBusy
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -19,6 +21,16 @@ def admin_required(f):
     return decorated_function
 
 
+@auth_bp.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(error):
+    """Turn requests away while the password hash pool is saturated"""
+    db.session.rollback()
+    flash('The server is busy right now. Please try again in a moment.', 'error')
+    if request.endpoint == 'auth.login':
+        return render_template('login.html'), 503, {'Retry-After': '5'}
+    return redirect(request.referrer or url_for('auth.login'))
+
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     """User login"""
@@ -38,7 +50,6 @@ def login():
             print(f"Login attempt - Email: {email}")
             print(f"User found: {user is not None}")
             if user:
-                print(f"Password check: {user.check_password(password)}")
                 print(f"User active: {user.is_active}")
         
         if user and user.check_password(password):
@@ -46,6 +57,13 @@ def login():
                 flash('Your account has been deactivated. Please contact admin.', 'error')
                 return redirect(url_for('auth.login'))
             
+            # Upgrade hashes made with older parameters while the password is at hand
+            if user.needs_rehash():
+                try:
+                    user.set_password(password)
+                except PasswordHasherBusy:
+                    pass
+            
             login_user(user, remember=remember)
             user.last_login = datetime.utcnow()
             db.session.commit()
@@ -242,12 +260,10 @@ def admin_delete_user(user_id):
     
     user = User.query.get_or_404(user_id)
     
-    # Delete user (cascade should handle files/folders if configured, otherwise we might need manual cleanup)
-    # The User model has cascade='all, delete-orphan' on files and folders relationships, so it should be fine.
-    
+    # Remove files and folders in bulk rather than through the ORM cascade,
+    # which would load and delete every row individually
     username = user.username
-    db.session.delete(user)
-    db.session.commit()
+    deletion_service.delete_user(user)
     
     flash(f'User "{username}" deleted successfully.', 'success')
     return redirect(url_for('auth.admin_users'))
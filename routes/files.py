@@ -9,6 +9,8 @@ from extensions import db
 from models.file import File
 from models.folder import Folder
 from services.file_service import FileService
+from services.deletion import deletion_service
+from services.request_metrics import request_metrics
 from config import Config
 
 files_bp = Blueprint('files', __name__)
@@ -110,6 +112,7 @@ def download(file_id):
         return redirect(url_for('files.index'))
     
     file.update_access_time()
+    request_metrics.add_io(read=file.size)
     
     return send_file(file.file_path, 
                     as_attachment=True, 
@@ -236,14 +239,9 @@ def delete_permanent(file_id):
         return redirect(url_for('files.trash'))
     
     filename = file.original_filename
-    file.hard_delete()
     
-    # Update quota if user deleted their own file
-    if file.user_id == current_user.id:
-        current_user.update_storage_used()
-    # If admin deleted another user's file, we should update that user's quota too
-    else:
-        file.owner.update_storage_used()
+    # Also reconciles the owner's quota, whoever deleted the file
+    deletion_service.hard_delete([file.id])
     
     flash(f'File "{filename}" permanently deleted.', 'success')
     return redirect(request.referrer or url_for('files.trash'))
@@ -305,6 +303,7 @@ def preview(file_id):
         try:
             with open(file.file_path, 'r', encoding='utf-8', errors='ignore') as f:
                 text_content = f.read(10000)  # limit preview size
+            request_metrics.add_io(read=len(text_content))
         except Exception:
             text_content = None
 
@@ -5,6 +5,7 @@ from flask_login import login_required, current_user
 from functools import wraps
 from extensions import db
 from services.greenops import GreenOpsService
+from services.storage_analytics import StorageAnalytics
 
 greenops_bp = Blueprint('greenops', __name__)
 
@@ -30,7 +31,8 @@ def dashboard():
         'storage_optimization': service.get_storage_optimization_stats(),
         'duplicate_files': service.find_duplicate_files(),
         'old_files': service.get_old_files(),
-        'suggestions': service.get_suggestions()
+        'suggestions': service.get_suggestions(),
+        'breakdown': StorageAnalytics().get_breakdown()
     }
     
     return render_template('greenops/dashboard.html', stats=stats)
@@ -83,6 +85,17 @@ def optimize():
     })
 
 
+@greenops_bp.route('/analytics')
+@login_required
+@admin_required
+def analytics():
+    """Storage breakdown by type, age and folder"""
+    scope = request.args.get('scope', 'global')
+    user_id = current_user.id if scope == 'user' else None
+    
+    return jsonify({'breakdown': StorageAnalytics(user_id).get_breakdown()})
+
+
 @greenops_bp.route('/duplicates')
 @login_required
 @admin_required
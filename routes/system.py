@@ -1,9 +1,17 @@
 """System monitoring routes"""
 
-from flask import Blueprint, jsonify, render_template, abort
+from flask import Blueprint, jsonify, render_template, abort, request, Response, stream_with_context
 from flask_login import login_required, current_user
 from functools import wraps
+from extensions import db
+from models.user import User
 from services.system_monitor import system_monitor
+from services.request_metrics import request_metrics
+from services.metrics_history import metrics_history, parse_range
+from services.live_stats import live_stats
+from services.scheduler import scheduler
+from services.profiler import sampling_profiler
+from services.query_log import slow_query_log
 
 system_bp = Blueprint('system', __name__)
 
@@ -31,7 +39,13 @@ def monitor_dashboard():
     return render_template('system/monitor.html', 
                          summary=summary, 
                          energy_score=energy_score,
-                         recommendations=recommendations)
+                         recommendations=recommendations,
+                         usage=_get_request_usage(),
+                         processes=system_monitor.get_process_breakdown(),
+                         jobs=scheduler.get_status(),
+                         job_queue=scheduler.get_queue_status(),
+                         slow_queries=slow_query_log.get_summary(),
+                         live_stream=_streams_supported())
 
 
 @system_bp.route('/api/stats')
@@ -51,6 +65,30 @@ def get_system_stats():
     })
 
 
+@system_bp.route('/api/stream')
+@login_required
+@admin_required
+def stream_system_stats():
+    """Push system stats and alerts as Server-Sent Events"""
+    if not _streams_supported():
+        # A sync worker would be held for the whole stream and killed by its timeout
+        return jsonify({'success': False, 'error': 'Live streams need a threaded server (GUNICORN_PROFILE=gthread)'}), 503
+    if not live_stats.subscribe():
+        return jsonify({'success': False, 'error': 'Too many live streams, try again later'}), 503
+    
+    eco_mode_enabled = current_user.eco_mode_enabled
+    # The stream never touches the database; give the connection back now
+    db.session.remove()
+    
+    response = Response(stream_with_context(live_stats.stream(eco_mode_enabled)),
+                        mimetype='text/event-stream')
+    # Runs even if the client leaves before the generator is first iterated
+    response.call_on_close(live_stats.unsubscribe)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @system_bp.route('/api/alerts')
 @login_required
 @admin_required
@@ -73,3 +111,131 @@ def get_recommendations():
         'success': True,
         'recommendations': recommendations
     })
+
+
+@system_bp.route('/api/requests')
+@login_required
+@admin_required
+def get_request_usage():
+    """Get measured resource usage per endpoint and per user"""
+    minutes = request.args.get('minutes', type=int)
+    return jsonify({
+        'success': True,
+        'usage': _get_request_usage(minutes)
+    })
+
+
+@system_bp.route('/api/processes')
+@login_required
+@admin_required
+def get_processes():
+    """Get resource usage of each server process"""
+    return jsonify({
+        'success': True,
+        'processes': system_monitor.get_process_breakdown()
+    })
+
+
+@system_bp.route('/api/jobs')
+@login_required
+@admin_required
+def get_jobs():
+    """Get background job queue and status"""
+    return jsonify({
+        'success': True,
+        'queue': scheduler.get_queue_status(),
+        'jobs': scheduler.get_status()
+    })
+
+
+@system_bp.route('/api/slow-queries')
+@login_required
+@admin_required
+def get_slow_queries():
+    """Get this worker's slowest statements with their query plans"""
+    return jsonify({
+        'success': True,
+        'slow_queries': slow_query_log.get_summary(request.args.get('limit', 20, type=int))
+    })
+
+
+@system_bp.route('/api/profile', methods=['POST'])
+@login_required
+@admin_required
+def start_profile():
+    """Sample every worker's request stacks for a few seconds"""
+    data = request.get_json(silent=True) or {}
+    try:
+        session = sampling_profiler.start(data.get('seconds', 10))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'seconds must be a number'}), 400
+    
+    return jsonify({
+        'success': True,
+        'id': session['id'],
+        'seconds': round(session['until'] - session['started'])
+    }), 202
+
+
+@system_bp.route('/api/profile/<session_id>')
+@login_required
+@admin_required
+def get_profile(session_id):
+    """Get the hot functions of a profiling session"""
+    result = sampling_profiler.get_result(session_id, limit=request.args.get('limit', 20, type=int))
+    if result is None:
+        abort(404)
+    return jsonify({'success': True, 'profile': result})
+
+
+@system_bp.route('/api/profile/<session_id>/collapsed')
+@login_required
+@admin_required
+def get_profile_collapsed(session_id):
+    """Download a session as collapsed stacks for flamegraph tools"""
+    collapsed = sampling_profiler.get_collapsed(session_id)
+    if collapsed is None:
+        abort(404)
+    return Response(collapsed, mimetype='text/plain', headers={
+        'Content-Disposition': f'attachment; filename=profile-{session_id}.txt'
+    })
+
+
+@system_bp.route('/api/history')
+@login_required
+@admin_required
+def get_history():
+    """Get metric history, e.g. ?metric=cpu&range=6h"""
+    metric = request.args.get('metric', 'cpu')
+    
+    try:
+        range_seconds = parse_range(request.args.get('range'))
+        history = metrics_history.query(metric, range_seconds)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'metric': metric,
+        'range': range_seconds,
+        'resolution': history['resolution'],
+        'points': history['points']
+    })
+
+
+def _get_request_usage(minutes=None):
+    """Get request usage summary with usernames resolved"""
+    usage = request_metrics.get_summary(minutes)
+    
+    user_ids = [row['key'] for row in usage['users']]
+    if user_ids:
+        names = dict(User.query.with_entities(User.id, User.username).filter(User.id.in_(user_ids)))
+        for row in usage['users']:
+            row['username'] = names.get(row['key'], f"user {row['key']}")
+    
+    return usage
+
+
+def _streams_supported():
+    """Whether this server can hold a long stream without tying up a whole worker"""
+    return bool(request.environ.get('wsgi.multithread'))
@@ -3,5 +3,6 @@
 from services.file_service import FileService
 from services.ai_agent import AIAgent
 from services.greenops import GreenOpsService
+from services.deletion import DeletionService
 
-__all__ = ['FileService', 'AIAgent', 'GreenOpsService']
+__all__ = ['FileService', 'AIAgent', 'GreenOpsService', 'DeletionService']
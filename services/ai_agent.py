@@ -1,71 +1,99 @@
 """AI Agent service - Rule-based intelligent assistant"""
 
-from models.user import User
 from models.file import File
-from models.folder import Folder
 from services.greenops import GreenOpsService
+from services.storage_analytics import StorageAnalytics
+from services.intent_matcher import intent_matcher
+from services.service_context import service_context
+from services.cache import panel_cache, user_scope
+from services.file_index import file_index
+from services.suggestions import suggestion_service
 from datetime import datetime, timedelta
 
 
+# Intent names from services.intent_matcher -> handler method
+INTENT_HANDLERS = {
+    'system': '_handle_system_query',
+    'energy': '_handle_energy_query',
+    'breakdown': '_handle_breakdown_query',
+    'storage': '_handle_storage_query',
+    'file_count': '_handle_file_count_query',
+    'cleanup': '_handle_cleanup_query',
+    'duplicate': '_handle_duplicate_query',
+    'greenops': '_handle_greenops_query',
+    'help': '_handle_help_query',
+    'upload': '_handle_upload_help',
+    'organize': '_handle_organization_help',
+    'recent': '_handle_recent_query',
+    'find': '_handle_find_query'
+}
+
+# Intents whose answers are built in sections, cheapest first, so they can be
+# streamed while the slower metric sections are prepared
+STREAMED_INTENTS = {
+    'system': '_stream_system_query',
+    'energy': '_stream_energy_query'
+}
+
+# Answers that depend only on the user's files and settings. They are cached
+# in the user's panel cache scope, whose generation moves on every change.
+# 'recent' is left out: its "Today" and "N days ago" labels age without a change
+CACHED_INTENTS = {'storage', 'breakdown', 'file_count', 'cleanup', 'duplicate', 'greenops', 'upload'}
+
+
 class AIAgent:
     """Lightweight rule-based AI agent for assistance"""
     
     def __init__(self, user_id):
         self.user_id = user_id
-        self.user = User.query.get(user_id)
+        self.context = service_context(user_id)
+        self.user = self.context.user
         self.greenops = GreenOpsService(user_id)
     
     def process_message(self, message):
         """Process user message and generate response"""
-        message = message.lower().strip()
-        
-        # System/Resource queries
-        if any(word in message for word in ['cpu', 'memory', 'ram', 'system', 'resources', 'performance']):
-            return self._handle_system_query()
-        
-        # Energy queries
-        elif any(word in message for word in ['energy', 'battery', 'power', 'energy score']):
-            return self._handle_energy_query()
-        
-        # Storage queries
-        elif any(word in message for word in ['storage', 'space', 'quota', 'how much']):
-            return self._handle_storage_query()
-        
-        # File count queries
-        elif any(word in message for word in ['how many files', 'file count', 'number of files']):
-            return self._handle_file_count_query()
-        
-        # Cleanup suggestions
-        elif any(word in message for word in ['cleanup', 'clean', 'optimize', 'free space']):
-            return self._handle_cleanup_query()
-        
-        # Duplicate files
-        elif any(word in message for word in ['duplicate', 'duplicates', 'same files']):
-            return self._handle_duplicate_query()
-        
-        # GreenOps information
-        elif any(word in message for word in ['greenops', 'green', 'eco', 'sustainable']):
-            return self._handle_greenops_query()
-        
-        # Help queries
-        elif any(word in message for word in ['help', 'how to', 'what can you do']):
-            return self._handle_help_query()
-        
-        # Upload help
-        elif any(word in message for word in ['upload', 'add file']):
-            return self._handle_upload_help()
-        
-        # Organization help
-        elif any(word in message for word in ['organize', 'manage', 'folder']):
-            return self._handle_organization_help()
-        
-        # Recent activity
-        elif any(word in message for word in ['recent', 'latest', 'new']):
-            return self._handle_recent_query()
-        
-        # Default response
-        else:
+        self.message = message
+        intent = intent_matcher.match(message)
+        if intent is None:
             return self._handle_default()
+        
+        handler = getattr(self, INTENT_HANDLERS[intent])
+        if intent in CACHED_INTENTS:
+            return panel_cache.get_or_compute(user_scope(self.user_id), f'ai:{intent}', handler)
+        return handler()
+    
+    def stream_message(self, message):
+        """Yield the response to a message as it becomes ready
+        
+        Yields {'section': text} items, then one {'done': True, ...} item
+        carrying the response data. Intents without sections arrive as a
+        single section.
+        """
+        self.message = message
+        intent = intent_matcher.match(message)
+        
+        if intent not in STREAMED_INTENTS:
+            response = self.process_message(message)
+            yield {'section': response['text']}
+            yield {'done': True, 'data': response.get('data'), 'suggestions': response.get('suggestions', [])}
+            return
+        
+        sections = getattr(self, STREAMED_INTENTS[intent])()
+        while True:
+            try:
+                yield {'section': next(sections)}
+            except StopIteration as stop:
+                yield {'done': True, 'data': stop.value, 'suggestions': []}
+                return
+    
+    def _collect(self, sections):
+        """Join a section generator into a plain response"""
+        text = ''
+        while True:
+            try:
+                text += next(sections)
+            except StopIteration as stop:
+                return {'text': text, 'data': stop.value}
     
     def _handle_storage_query(self):
         """Handle storage-related queries"""
@@ -96,11 +124,38 @@ class AIAgent:
             }
         }
     
+    def _handle_breakdown_query(self):
+        """Handle 'what is using my space' queries"""
+        breakdown = StorageAnalytics(self.user_id).get_breakdown()
+        
+        response = f"📦 **What Is Using Your Space**\n\n"
+        
+        if not breakdown['total_files']:
+            response += "No files uploaded yet, so nothing is using space."
+            return {'text': response, 'data': breakdown}
+        
+        response += "**By type:**\n"
+        for row in breakdown['by_family'][:5]:
+            share = row['bytes'] / breakdown['total_bytes'] * 100 if breakdown['total_bytes'] else 0
+            response += f"• {row['key']}: {row['bytes'] / (1024**2):.1f} MB ({share:.0f}%, {row['count']} files)\n"
+        
+        response += "\n**Biggest folders:**\n"
+        for row in breakdown['by_folder'][:3]:
+            response += f"• {row['key']}: {row['bytes'] / (1024**2):.1f} MB\n"
+        
+        old = breakdown['by_age'][-1]
+        if old['count']:
+            response += f"\n🕰️ {old['count']} files ({old['bytes'] / (1024**2):.1f} MB) are over a year old.\n"
+        if breakdown['trash_bytes']:
+            response += f"🗑️ Trash holds {breakdown['trash_bytes'] / (1024**2):.1f} MB.\n"
+        
+        return {'text': response, 'data': breakdown}
+    
     def _handle_file_count_query(self):
         """Handle file count queries"""
-        file_count = File.query.filter_by(user_id=self.user_id, is_deleted=False).count()
-        folder_count = Folder.query.filter_by(user_id=self.user_id, is_deleted=False).count()
-        trash_count = File.query.filter_by(user_id=self.user_id, is_deleted=True).count()
+        file_count = self.context.file_count()
+        folder_count = self.context.folder_count()
+        trash_count = self.context.trash_count()
         
         response = f"📊 **Your Files Summary**\n\n"
         response += f"• Active Files: {file_count}\n"
@@ -121,6 +176,12 @@ class AIAgent:
         else:
             response += "✨ Your storage is well organized! No cleanup needed right now."
         
+        # Point cleanup at the biggest consumers first
+        top = StorageAnalytics(self.user_id).get_top_consumers(limit=2)
+        if top['families']:
+            biggest = ', '.join(f"{row['key']} ({row['bytes'] / (1024**2):.1f} MB)" for row in top['families'])
+            response += f"\n📦 Biggest consumers: {biggest}"
+        
         return {'text': response, 'suggestions': suggestions}
     
     def _handle_duplicate_query(self):
@@ -164,6 +225,7 @@ class AIAgent:
         response = f"🤖 **GreenBot Help**\n\n"
         response += "I can help you with:\n\n"
         response += "📊 **Storage**: Ask about storage usage and quota\n"
+        response += "📦 **Breakdown**: Ask what is eating your space\n"
         response += "🧹 **Cleanup**: Get cleanup suggestions\n"
         response += "🔍 **Duplicates**: Find duplicate files\n"
         response += "🌱 **GreenOps**: Learn about eco-friendly features\n"
@@ -226,52 +288,82 @@ class AIAgent:
         
         return {'text': response}
     
+    def _handle_find_query(self):
+        """Handle 'where is my ...' queries with the file search index"""
+        matches = file_index.search(self.user_id, self.message)
+        
+        response = f"🔎 **Matching Files**\n\n"
+        
+        if matches:
+            for match in matches:
+                created = datetime.strptime(match['created'], '%Y-%m-%d').strftime('%b %d, %Y') if match['created'] else ''
+                location = match['folder'] or 'Root'
+                response += f"• {match['name']} in {location} ({created})\n"
+        else:
+            response += "I couldn't find a file matching that. Try words from its name, tags or folder."
+        
+        return {'text': response, 'data': {'files': matches}}
+    
     def _handle_system_query(self):
         """Handle system resource queries"""
+        return self._collect(self._stream_system_query())
+    
+    def _stream_system_query(self):
+        """Yield the system answer section by section, returning its data"""
         from services.system_monitor import system_monitor
         
-        summary = system_monitor.get_system_summary()
+        uptime = system_monitor.get_server_uptime()
+        yield f"💻 **System Resources**\n\n• Uptime: {uptime['formatted']}\n"
         
-        response = f"💻 **System Resources**\n\n"
-        response += f"• CPU Usage: {summary['cpu']['percent']}%\n"
+        # Waits for the first sample when the sampler has just started
+        summary = system_monitor.get_system_summary()
+        response = f"• CPU Usage: {summary['cpu']['percent']}%\n"
         response += f"• Memory: {summary['memory']['percent']:.1f}% ({summary['memory']['used_gb']:.2f} / {summary['memory']['total_gb']:.2f} GB)\n"
-        response += f"• Disk: {summary['disk']['percent']:.1f}% ({summary['disk']['free_gb']:.2f} GB free)\n"
-        response += f"• Uptime: {summary['uptime']['formatted']}\n\n"
+        response += f"• Disk: {summary['disk']['percent']:.1f}% ({summary['disk']['free_gb']:.2f} GB free)\n\n"
+        yield response
         
         if summary['alerts']:
-            response += "⚠️ **Alerts:**\n"
+            response = "⚠️ **Alerts:**\n"
             for alert in summary['alerts']:
                 response += f"• {alert['message']}\n"
         else:
-            response += "✅ All systems running smoothly!"
+            response = "✅ All systems running smoothly!"
+        yield response
         
-        return {'text': response, 'data': summary}
+        return summary
     
     def _handle_energy_query(self):
         """Handle energy/battery queries"""
+        return self._collect(self._stream_energy_query())
+    
+    def _stream_energy_query(self):
+        """Yield the energy answer section by section"""
         from services.system_monitor import system_monitor
         
+        eco_mode = 'on' if self.user.eco_mode_enabled else 'off'
+        yield f"⚡ **Energy Status**\n\nEco Mode: {eco_mode}\n"
+        
+        # Waits for the first sample when the sampler has just started
         summary = system_monitor.get_system_summary()
         energy_score = system_monitor.calculate_energy_score({
             'eco_mode_enabled': self.user.eco_mode_enabled
         })
         
-        response = f"⚡ **Energy Status**\n\n"
-        response += f"Energy Score: {energy_score}/100\n"
+        response = f"Energy Score: {energy_score}/100\n"
         response += f"Status: {summary['energy_message']}\n\n"
         
         if summary['battery']:
             battery = summary['battery']
             response += f"🔋 Battery: {battery['percent']}%\n"
             response += f"Status: {'Charging' if battery['plugged'] else 'On Battery'}\n\n"
+        yield response
         
         recommendations = system_monitor.get_eco_recommendations(self.user_id)
         if recommendations:
-            response += "💡 **Recommendations:**\n"
+            response = "💡 **Recommendations:**\n"
             for rec in recommendations[:3]:
                 response += f"• {rec['message']}\n"
-        
-        return {'text': response}
+            yield response
     
     def _handle_default(self):
         """Handle default/unknown queries"""
@@ -289,34 +381,8 @@ class AIAgent:
         return {'text': response}
     
     def get_smart_suggestions(self):
-        """Get smart suggestions for the user"""
-        suggestions = []
-        
-        # Storage suggestions
-        percentage = self.user.get_storage_percentage()
-        if percentage > 80:
-            suggestions.append("Your storage is getting full. Consider cleaning up old files.")
-        
-        # Trash suggestions
-        trash_count = File.query.filter_by(user_id=self.user_id, is_deleted=True).count()
-        if trash_count > 10:
-            suggestions.append(f"You have {trash_count} files in trash. Empty it to free up space.")
-        
-        # Duplicate suggestions
-        duplicates = self.greenops.find_duplicate_files()
-        if len(duplicates) > 0:
-            suggestions.append(f"Found {len(duplicates)} duplicate file groups. Review them to save space.")
-        
-        # Organization suggestions
-        files_without_folder = File.query.filter_by(
-            user_id=self.user_id,
-            folder_id=None,
-            is_deleted=False
-        ).count()
-        if files_without_folder > 5:
-            suggestions.append("You have files without folders. Organize them for better management.")
-        
-        return suggestions
+        """Get smart suggestions for the user, precomputed by the suggestions job"""
+        return suggestion_service.get(self.user_id)['smart']
     
     def get_help_topics(self):
         """Get available help topics"""
@@ -324,6 +390,7 @@ class AIAgent:
             {'title': 'System Resources', 'query': 'system resources'},
             {'title': 'Energy Usage', 'query': 'energy'},
             {'title': 'Storage Management', 'query': 'storage'},
+            {'title': 'Storage Breakdown', 'query': 'what is eating my space'},
             {'title': 'File Organization', 'query': 'organize'},
             {'title': 'Upload Files', 'query': 'upload'},
             {'title': 'Cleanup Tips', 'query': 'cleanup'},
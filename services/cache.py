@@ -0,0 +1,161 @@
+"""Panel cache - computed dashboard data shared across workers"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from config import Config
+
+
+GLOBAL_SCOPE = 'global'
+
+# Bookkeeping written on every login or download that no panel shows
+IGNORED_ATTRIBUTES = {'last_login', 'last_accessed'}
+
+# File attributes shown by the shared recent files panel
+GLOBAL_FILE_ATTRIBUTES = {'is_deleted', 'original_filename', 'size'}
+
+
+def user_scope(user_id):
+    """Get the cache scope holding a user's panels"""
+    return f'user:{user_id}'
+
+
+class PanelCache:
+    """TTL cache in a local SQLite file with generation-based invalidation
+
+    Every scope (one per user plus a global one) has a generation counter.
+    Entries are stored with the generation they were computed under, so
+    bumping the counter invalidates a whole scope in a single write and
+    every gunicorn worker sees it immediately.
+    """
+
+    def __init__(self, path=None, ttl=None):
+        self.path = path or Config.CACHE_PATH
+        self.ttl = ttl or Config.CACHE_DEFAULT_TTL
+        self._local = threading.local()
+
+    def get(self, scope, name):
+        """Get a cached value, or None when missing, stale or expired"""
+        row = self._connection().execute(
+            'SELECT e.value FROM entries e LEFT JOIN generations g ON g.scope = ? '
+            'WHERE e.key = ? AND e.generation = COALESCE(g.generation, 0) AND e.expires_at > ?',
+            (scope, f'{scope}/{name}', time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, scope, name, value, ttl=None, generation=None):
+        """Store a value under the generation it was computed from (default: the current one)"""
+        if generation is None:
+            generation = self.generation(scope)
+        self._connection().execute(
+            'INSERT OR REPLACE INTO entries (key, generation, value, expires_at) VALUES (?, ?, ?, ?)',
+            (f'{scope}/{name}', generation, json.dumps(value, default=str), time.time() + (ttl or self.ttl))
+        )
+
+    def get_or_compute(self, scope, name, compute, ttl=None):
+        """Get a cached value, computing and storing it on a miss"""
+        value = self.get(scope, name)
+        if value is None:
+            # Read the generation first: an invalidation landing while compute()
+            # runs then leaves the stored value already stale
+            generation = self.generation(scope)
+            value = compute()
+            self.set(scope, name, value, ttl, generation)
+        return value
+
+    def invalidate(self, *scopes):
+        """Bump the generation of each scope"""
+        if not scopes:
+            return
+        self._connection().executemany(
+            'INSERT INTO generations (scope, generation) VALUES (?, 1) '
+            'ON CONFLICT(scope) DO UPDATE SET generation = generation + 1',
+            [(scope,) for scope in set(scopes)]
+        )
+
+    def generation(self, scope):
+        """Get the current generation of a scope"""
+        row = self._connection().execute(
+            'SELECT generation FROM generations WHERE scope = ?', (scope,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def purge_expired(self):
+        """Drop expired entries"""
+        return self._connection().execute(
+            'DELETE FROM entries WHERE expires_at <= ?', (time.time(),)
+        ).rowcount
+
+    def _connection(self):
+        """Get this thread's connection, reopening it after a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT PRIMARY KEY, generation INTEGER, value TEXT, expires_at REAL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS generations (scope TEXT PRIMARY KEY, generation INTEGER)'
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+
+def changed_attributes(obj):
+    """Get the names of the attributes with pending changes on an object"""
+    state = inspect(obj)
+    return {attr.key for attr in state.attrs if attr.history.has_changes()}
+
+
+def _collect_scopes(session, flush_context, instances):
+    """Remember which scopes the pending changes touch"""
+    from models.user import User
+    from models.file import File
+    from models.folder import Folder
+
+    scopes = session.info.setdefault('cache_scopes', set())
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, User):
+            scopes.add(user_scope(obj.id))
+        elif isinstance(obj, (File, Folder)):
+            scopes.add(user_scope(obj.user_id))
+            if isinstance(obj, File):
+                scopes.add(GLOBAL_SCOPE)
+
+    for obj in session.dirty:
+        if not isinstance(obj, (User, File, Folder)):
+            continue
+        changed = changed_attributes(obj)
+        if changed and changed <= IGNORED_ATTRIBUTES:
+            continue
+        scopes.add(user_scope(obj.id if isinstance(obj, User) else obj.user_id))
+        if isinstance(obj, File) and changed & GLOBAL_FILE_ATTRIBUTES:
+            scopes.add(GLOBAL_SCOPE)
+
+
+def _invalidate_committed(session):
+    scopes = session.info.pop('cache_scopes', None)
+    if scopes:
+        panel_cache.invalidate(*scopes)
+
+
+def _discard_scopes(session):
+    session.info.pop('cache_scopes', None)
+
+
+event.listen(Session, 'before_flush', _collect_scopes)
+event.listen(Session, 'after_commit', _invalidate_committed)
+event.listen(Session, 'after_rollback', _discard_scopes)
+
+
+# Global instance
+panel_cache = PanelCache()
@@ -0,0 +1,192 @@
+"""Deletion service - bulk permanent removal of files"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import func, select
+from extensions import db
+from models.file import File
+from models.folder import Folder
+from models.user import User
+from models.pending_deletion import PendingDeletion
+from models.user_suggestions import UserSuggestions
+from services.cache import panel_cache, GLOBAL_SCOPE
+from services.file_index import file_index
+from services.suggestions import suggestion_service
+from services.user_cache import user_cache
+from config import Config
+
+
+class DeletionService:
+    """Delete files in batched statements and unlink them in parallel"""
+
+    def hard_delete(self, file_ids, *criteria):
+        """Permanently delete files from the database and storage
+
+        Extra SQLAlchemy `criteria` are re-checked in the DELETE itself, so
+        rows that changed since the caller selected them are left alone.
+        Returns a summary with the number of deleted rows, failed unlinks
+        and the affected users.
+        """
+        file_ids = list(file_ids)
+        if not file_ids:
+            return {'deleted': 0, 'failed': 0, 'user_ids': set()}
+
+        rows = []
+        for start in range(0, len(file_ids), Config.DELETION_BATCH_SIZE):
+            rows += self._select_rows(
+                File.id.in_(file_ids[start:start + Config.DELETION_BATCH_SIZE]), *criteria
+            )
+        root_ids = {row.id for row in rows}
+        versions = [row for row in self._collect_versions(list(root_ids)) if row.id not in root_ids]
+
+        # Versions go first so their parent_file_id never dangles
+        deleted = self._delete_batches([row.id for row in versions])
+        deleted += self._delete_batches([row.id for row in rows], *criteria)
+
+        all_rows = versions + rows
+        survivors = set()
+        if deleted != len(all_rows):
+            survivors = {file_id for (file_id,) in db.session.query(File.id).filter(
+                File.id.in_([row.id for row in all_rows])
+            )}
+
+        user_ids = {row.user_id for row in all_rows if row.id not in survivors}
+        self.reconcile_storage_used(user_ids)
+        suggestion_service.invalidate(user_ids)
+        db.session.commit()
+        
+        # Bulk statements bypass the session events that invalidate panels and cached users
+        panel_cache.invalidate(GLOBAL_SCOPE)
+        user_cache.invalidate(*user_ids)
+        file_index.queue((row.user_id, 'file', row.id) for row in all_rows if row.id not in survivors)
+
+        failed = self.unlink_files([row.file_path for row in all_rows if row.id not in survivors])
+
+        return {'deleted': deleted, 'failed': failed, 'user_ids': user_ids}
+
+    def delete_user(self, user):
+        """Delete a user together with all of their files and folders"""
+        file_ids = [file_id for (file_id,) in db.session.query(File.id).filter_by(user_id=user.id)]
+        result = self.hard_delete(file_ids)
+
+        # Other users may have uploaded into this user's folders
+        folder_ids = select(Folder.id).where(Folder.user_id == user.id)
+        moved = db.session.query(File.user_id, File.id).filter(File.folder_id.in_(folder_ids)).all()
+        File.query.filter(File.folder_id.in_(folder_ids)).update(
+            {File.folder_id: None}, synchronize_session=False
+        )
+        Folder.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+        UserSuggestions.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+
+        user_id = user.id
+        db.session.delete(user)
+        db.session.commit()
+        panel_cache.invalidate(GLOBAL_SCOPE)
+        file_index.queue((owner_id, 'file', file_id) for owner_id, file_id in moved)
+        file_index.drop_user(user_id)
+
+        return result
+
+    def unlink_files(self, paths):
+        """Remove physical files on a bounded pool, queueing failures for retry"""
+        if not paths:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=Config.DELETION_WORKERS) as pool:
+            errors = list(pool.map(self._unlink, paths))
+
+        failures = [(path, error) for path, error in zip(paths, errors) if error]
+        for path, error in failures:
+            db.session.add(PendingDeletion(file_path=path, last_error=error))
+        if failures:
+            db.session.commit()
+
+        return len(failures)
+
+    def retry_pending(self):
+        """Retry queued physical deletions"""
+        pending = PendingDeletion.query.filter(
+            PendingDeletion.attempts < Config.DELETION_MAX_ATTEMPTS
+        ).order_by(PendingDeletion.created_at).limit(Config.DELETION_BATCH_SIZE).all()
+
+        if not pending:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=Config.DELETION_WORKERS) as pool:
+            errors = list(pool.map(self._unlink, [item.file_path for item in pending]))
+
+        removed = 0
+        for item, error in zip(pending, errors):
+            if error:
+                item.attempts += 1
+                item.last_error = error
+                item.last_attempt_at = datetime.utcnow()
+            else:
+                db.session.delete(item)
+                removed += 1
+
+        db.session.commit()
+        return removed
+
+    def get_pending_count(self):
+        """Get number of physical deletions waiting for retry"""
+        return PendingDeletion.query.count()
+
+    @staticmethod
+    def reconcile_storage_used(user_ids):
+        """Recalculate storage_used for several users in one statement"""
+        if not user_ids:
+            return
+
+        active_total = select(func.coalesce(func.sum(File.size), 0)).where(
+            File.user_id == User.id,
+            File.is_deleted == False
+        ).scalar_subquery()
+
+        User.query.filter(User.id.in_(user_ids)).update(
+            {User.storage_used: active_total}, synchronize_session=False
+        )
+
+    def _select_rows(self, *criteria):
+        """Select the columns needed for deletion"""
+        return db.session.query(File.id, File.user_id, File.file_path).filter(*criteria).all()
+
+    def _collect_versions(self, root_ids):
+        """Collect all version rows below the given files, deepest first"""
+        levels = []
+        parent_ids = root_ids
+        while parent_ids:
+            level = []
+            for start in range(0, len(parent_ids), Config.DELETION_BATCH_SIZE):
+                level += self._select_rows(
+                    File.parent_file_id.in_(parent_ids[start:start + Config.DELETION_BATCH_SIZE])
+                )
+            levels.append(level)
+            parent_ids = [row.id for row in level]
+
+        return [row for level in reversed(levels) for row in level]
+
+    def _delete_batches(self, ids, *criteria):
+        """Issue one DELETE per batch of ids"""
+        deleted = 0
+        for start in range(0, len(ids), Config.DELETION_BATCH_SIZE):
+            deleted += File.query.filter(
+                File.id.in_(ids[start:start + Config.DELETION_BATCH_SIZE]), *criteria
+            ).delete(synchronize_session=False)
+        return deleted
+
+    @staticmethod
+    def _unlink(file_path):
+        """Remove a physical file, returning an error message on failure"""
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            return str(e)
+        return None
+
+
+# Global instance
+deletion_service = DeletionService()
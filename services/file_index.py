@@ -0,0 +1,296 @@
+"""File search index - lets the AI agent find files by what they are called"""
+
+import math
+import os
+import sqlite3
+import threading
+from collections import Counter
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, joinedload
+from extensions import db
+from services.intent_matcher import tokenize
+from config import Config
+
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Each token of a field counts this many times towards its term frequency
+FIELD_WEIGHTS = {'name': 2, 'tags': 2, 'folder': 1, 'description': 1}
+
+# Changes to these attributes make a file or folder need reindexing
+FILE_ATTRIBUTES = ('original_filename', 'tags', 'description', 'folder_id', 'is_deleted', 'created_at')
+FOLDER_ATTRIBUTES = ('name', 'path', 'parent_id')
+
+MONTHS = {
+    'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3, 'april': 4, 'apr': 4,
+    'may': 5, 'june': 6, 'jun': 6, 'july': 7, 'jul': 7, 'august': 8, 'aug': 8,
+    'september': 9, 'sep': 9, 'sept': 9, 'october': 10, 'oct': 10, 'november': 11, 'nov': 11,
+    'december': 12, 'dec': 12,
+}
+
+# Words of a question that say nothing about the file itself (after tokenize)
+STOPWORDS = {
+    'where', 'is', 'are', 'my', 'the', 'a', 'an', 'from', 'in', 'on', 'of', 'for', 'to', 'with',
+    'find', 'search', 'locate', 'look', 'looking', 'show', 'me', 'i', 'did', 'put', 'can', 'you',
+    'file', 'document', 'called', 'named', 'uploaded', 'that', 'which', 'it', 'have', 'any',
+}
+
+
+class FileIndex:
+    """BM25 ranking over each user's file names, tags, descriptions and folders
+
+    Postings live in a local SQLite file read through a memory map, so all
+    workers share one index. Commits that touch indexed attributes queue the
+    affected file and folder ids, and a user's next search reindexes only
+    those files. Their first search builds the whole index.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or Config.SEARCH_INDEX_PATH
+        self._local = threading.local()
+
+    def search(self, user_id, text, limit=None):
+        """Rank the user's files against a free text question
+
+        Month names restrict results to files uploaded in that month, or
+        whose name mentions it. Returns dicts with id, name, folder and
+        created date, best match first.
+        """
+        self.sync(user_id)
+        tokens = tokenize(text)
+        terms = sorted({token for token in tokens if token not in STOPWORDS and token not in MONTHS})
+        months = {token for token in tokens if token in MONTHS}
+        if not terms and not months:
+            return []
+
+        conn = self._connection()
+        scores = self._bm25(conn, user_id, terms) if terms else {
+            file_id: 0.0 for (file_id,) in conn.execute('SELECT file_id FROM docs WHERE user_id = ?', (user_id,))
+        }
+        if months:
+            scores = {file_id: score for file_id, score in scores.items()
+                      if file_id in self._in_months(conn, user_id, months)}
+        if not scores:
+            return []
+
+        placeholders = ','.join('?' * len(scores))
+        docs = {row[0]: row for row in conn.execute(
+            f'SELECT file_id, name, folder, created FROM docs WHERE file_id IN ({placeholders})', list(scores)
+        )}
+        ranked = sorted(scores, key=lambda file_id: (scores[file_id], docs[file_id][3]), reverse=True)
+        return [{
+            'id': file_id,
+            'name': docs[file_id][1],
+            'folder': docs[file_id][2],
+            'created': docs[file_id][3],
+            'score': round(scores[file_id], 3)
+        } for file_id in ranked[:limit or Config.SEARCH_RESULTS]]
+
+    def sync(self, user_id):
+        """Bring a user's index up to date, returning the files reindexed"""
+        from models.file import File
+
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            built = conn.execute('SELECT 1 FROM users WHERE user_id = ?', (user_id,)).fetchone()
+            pending = conn.execute(
+                'SELECT rowid, kind, item_id FROM pending WHERE user_id = ?', (user_id,)
+            ).fetchall()
+
+            if built and not pending:
+                conn.execute('COMMIT')
+                return 0
+
+            if built:
+                file_ids = {item_id for _, kind, item_id in pending if kind == 'file'}
+                folder_ids = [item_id for _, kind, item_id in pending if kind == 'folder']
+                if folder_ids:
+                    file_ids |= {file_id for (file_id,) in db.session.query(File.id).filter(
+                        File.user_id == user_id, File.folder_id.in_(folder_ids)
+                    )}
+                count = self._reindex(conn, user_id, file_ids)
+                conn.execute('DELETE FROM pending WHERE user_id = ? AND rowid <= ?',
+                             (user_id, max(rowid for rowid, _, _ in pending)))
+            else:
+                count = self._reindex(conn, user_id, None)
+                conn.execute('DELETE FROM pending WHERE user_id = ?', (user_id,))
+                conn.execute('INSERT INTO users (user_id) VALUES (?)', (user_id,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return count
+
+    def queue(self, changes):
+        """Mark (user_id, 'file' or 'folder', id) items for reindexing
+
+        Users whose index was never built are skipped; their first search
+        indexes everything anyway.
+        """
+        changes = list(changes)
+        if changes:
+            self._connection().executemany(
+                'INSERT INTO pending (user_id, kind, item_id) '
+                'SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM users WHERE user_id = ?)',
+                [(user_id, kind, item_id, user_id) for user_id, kind, item_id in changes]
+            )
+
+    def drop_user(self, user_id):
+        """Forget a deleted user's index"""
+        conn = self._connection()
+        for table in ('postings', 'docs', 'pending', 'users'):
+            conn.execute(f'DELETE FROM {table} WHERE user_id = ?', (user_id,))
+
+    def _reindex(self, conn, user_id, file_ids):
+        """Replace the postings of some files, or of all the user's files when None"""
+        from models.file import File
+
+        query = File.query.options(joinedload(File.folder)).filter(
+            File.user_id == user_id, File.is_deleted == False
+        )
+        if file_ids is None:
+            conn.execute('DELETE FROM postings WHERE user_id = ?', (user_id,))
+            conn.execute('DELETE FROM docs WHERE user_id = ?', (user_id,))
+            files = query.all()
+        else:
+            file_ids = list(file_ids)
+            files = []
+            for start in range(0, len(file_ids), Config.DELETION_BATCH_SIZE):
+                batch = file_ids[start:start + Config.DELETION_BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+                conn.execute(f'DELETE FROM postings WHERE file_id IN ({placeholders})', batch)
+                conn.execute(f'DELETE FROM docs WHERE file_id IN ({placeholders})', batch)
+                files += query.filter(File.id.in_(batch)).all()
+
+        for file in files:
+            folder = file.folder.path or file.folder.name if file.folder else ''
+            terms = _document_terms({
+                'name': file.original_filename,
+                'tags': (file.tags or '').replace(',', ' '),
+                'folder': folder,
+                'description': file.description or ''
+            })
+            conn.execute(
+                'INSERT INTO docs (file_id, user_id, length, name, folder, created) VALUES (?, ?, ?, ?, ?, ?)',
+                (file.id, user_id, sum(terms.values()), file.original_filename, folder,
+                 file.created_at.strftime('%Y-%m-%d') if file.created_at else '')
+            )
+            conn.executemany(
+                'INSERT INTO postings (user_id, term, file_id, tf) VALUES (?, ?, ?, ?)',
+                [(user_id, term, file.id, tf) for term, tf in terms.items()]
+            )
+        return len(files)
+
+    def _bm25(self, conn, user_id, terms):
+        """Score every file containing at least one term"""
+        total, average_length = conn.execute(
+            'SELECT COUNT(*), AVG(length) FROM docs WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        if not total:
+            return {}
+
+        placeholders = ','.join('?' * len(terms))
+        rows = conn.execute(
+            'SELECT p.term, p.file_id, p.tf, d.length FROM postings p JOIN docs d ON d.file_id = p.file_id '
+            f'WHERE p.user_id = ? AND p.term IN ({placeholders})', (user_id, *terms)
+        ).fetchall()
+
+        document_frequency = Counter(term for term, _, _, _ in rows)
+        scores = {}
+        for term, file_id, tf, length in rows:
+            df = document_frequency[term]
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            norm = K1 * (1 - B + B * length / (average_length or 1))
+            scores[file_id] = scores.get(file_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        return scores
+
+    def _in_months(self, conn, user_id, months):
+        """Files uploaded in, or named after, any of the months"""
+        numbers = sorted({MONTHS[month] for month in months})
+        words = sorted(months)
+        return {file_id for (file_id,) in conn.execute(
+            f'SELECT file_id FROM docs WHERE user_id = ? AND CAST(substr(created, 6, 2) AS INTEGER) '
+            f'IN ({",".join("?" * len(numbers))}) '
+            f'UNION SELECT file_id FROM postings WHERE user_id = ? AND term IN ({",".join("?" * len(words))})',
+            (user_id, *numbers, user_id, *words)
+        )}
+
+    def _connection(self):
+        """Get this thread's connection, reopening it after a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA mmap_size={Config.SEARCH_INDEX_MMAP_MB * 1024 * 1024}')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS postings (user_id INTEGER, term TEXT, file_id INTEGER, tf INTEGER, '
+                'PRIMARY KEY (user_id, term, file_id)) WITHOUT ROWID'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_postings_file_id ON postings (file_id)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS docs (file_id INTEGER PRIMARY KEY, user_id INTEGER, '
+                'length INTEGER, name TEXT, folder TEXT, created TEXT)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_docs_user_id ON docs (user_id)')
+            conn.execute('CREATE TABLE IF NOT EXISTS pending (user_id INTEGER, kind TEXT, item_id INTEGER)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_pending_user_id ON pending (user_id)')
+            conn.execute('CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+
+def _document_terms(fields):
+    """Weighted term frequencies of a file's fields"""
+    terms = Counter()
+    for field, text in fields.items():
+        for token in tokenize(text):
+            terms[token] += FIELD_WEIGHTS[field]
+    return terms
+
+
+def _changed(obj, attributes):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in attributes)
+
+
+def _collect_changes(session, flush_context):
+    """Remember which files and folders the flushed changes touch"""
+    from models.file import File
+    from models.folder import Folder
+
+    changes = session.info.setdefault('index_changes', set())
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, File):
+            changes.add((obj.user_id, 'file', obj.id))
+        elif isinstance(obj, Folder):
+            changes.add((obj.user_id, 'folder', obj.id))
+    for obj in session.dirty:
+        if isinstance(obj, File) and _changed(obj, FILE_ATTRIBUTES):
+            changes.add((obj.user_id, 'file', obj.id))
+        elif isinstance(obj, Folder) and _changed(obj, FOLDER_ATTRIBUTES):
+            changes.add((obj.user_id, 'folder', obj.id))
+
+
+def _queue_committed(session):
+    changes = session.info.pop('index_changes', None)
+    if changes:
+        file_index.queue(changes)
+
+
+def _discard_changes(session):
+    session.info.pop('index_changes', None)
+
+
+event.listen(Session, 'after_flush', _collect_changes)
+event.listen(Session, 'after_commit', _queue_committed)
+event.listen(Session, 'after_rollback', _discard_changes)
+
+
+# Global instance
+file_index = FileIndex()
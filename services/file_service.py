@@ -4,10 +4,14 @@ import os
 import hashlib
 from datetime import datetime
 from werkzeug.utils import secure_filename
+from sqlalchemy.orm import joinedload
 from extensions import db
 from models.file import File
 from models.folder import Folder
+from models.hash_failure import HashFailure
 from models.user import User
+from services.request_metrics import request_metrics
+from services.service_context import service_context
 from config import Config
 
 
@@ -16,7 +20,8 @@ class FileService:
     
     def __init__(self, user_id):
         self.user_id = user_id
-        self.user = User.query.get(user_id)
+        self.context = service_context(user_id)
+        self.user = self.context.user
     
     def upload_file(self, file, folder_id=None, **kwargs):
         """Upload a file"""
@@ -55,10 +60,13 @@ class FileService:
         
         # Save file
         file_path = os.path.join(upload_path, filename)
-        file.save(file_path)
+        file.save(file_path, buffer_size=Config.IO_CHUNK_SIZE)
         
-        # Calculate file hash
-        file_hash = self._calculate_file_hash(file_path)
+        # Small uploads are hashed right away; the hash backlog job fills in larger ones
+        file_hash = None
+        if file_size <= Config.HASH_INLINE_MAX_SIZE:
+            file_hash = self._calculate_file_hash(file_path)
+        request_metrics.add_io(read=file_size if file_hash else 0, written=file_size)
         
         # Get file extension
         extension = os.path.splitext(original_filename)[1].lower().replace('.', '')
@@ -78,8 +86,16 @@ class FileService:
         
         db.session.add(new_file)
         
-        # Update user storage
-        self.user.storage_used += file_size
+        # Update user storage in one statement, so concurrent uploads and
+        # recalculations elsewhere are not overwritten with a stale total
+        reserved = User.query.filter(
+            User.id == self.user_id,
+            User.storage_used + file_size <= User.storage_quota
+        ).update({User.storage_used: User.storage_used + file_size}, synchronize_session=False)
+        if not reserved:
+            db.session.rollback()
+            os.remove(file_path)
+            raise ValueError('Not enough storage space')
         
         db.session.commit()
         
@@ -129,6 +145,21 @@ class FileService:
             is_deleted=False
         ).order_by(File.created_at.desc()).limit(limit).all()
     
+    def get_recent_files_summary(self, limit=10):
+        """Get recent files as plain data for cached dashboard panels"""
+        files = File.query.options(joinedload(File.owner)).filter_by(
+            is_deleted=False
+        ).order_by(File.created_at.desc()).limit(limit).all()
+        
+        return [{
+            'id': f.id,
+            'original_filename': f.original_filename,
+            'icon_class': f.get_icon_class(),
+            'size_formatted': f.get_size_formatted(),
+            'created_at': f.created_at.strftime('%b %d, %Y'),
+            'owner': f.owner.username
+        } for f in files]
+    
     def get_file_count(self):
         """Get total file count"""
         # GLOBAL COUNT or User count? 
@@ -142,17 +173,11 @@ class FileService:
         # But the User Dashboard usually shows "My Storage".
         # Let's leave these as user-specific for now to track QUOTA.
         # But `get_recent_files` DEFINITELY needs to be global for the "feed".
-        return File.query.filter_by(
-            is_deleted=False,
-            user_id=self.user_id
-        ).count()
+        return self.context.file_count()
     
     def get_folder_count(self):
         """Get total folder count"""
-        return Folder.query.filter_by(
-            is_deleted=False,
-            user_id=self.user_id
-        ).count()
+        return self.context.folder_count()
     
     def get_storage_used(self):
         """Get storage used"""
@@ -174,10 +199,53 @@ class FileService:
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         return f"{name}_{timestamp}{ext}"
     
-    def _calculate_file_hash(self, file_path):
+    @staticmethod
+    def hash_backlog(limit=None):
+        """Hash uploaded files that have no hash yet, for duplicate detection"""
+        from services.system_monitor import system_monitor
+        
+        query = File.query.outerjoin(HashFailure, HashFailure.file_id == File.id).filter(
+            File.file_hash == None,
+            File.is_deleted == False,
+            db.or_(HashFailure.file_id == None, HashFailure.attempts < Config.HASH_MAX_ATTEMPTS)
+        )
+        # Eco mode users' files wait until the energy level is green
+        if system_monitor.get_energy_level()[0] != 'green':
+            query = query.join(User, File.user_id == User.id).filter(User.eco_mode_enabled != True)
+        # Files that failed before go last, so they cannot hold up new uploads
+        files = query.order_by(db.func.coalesce(HashFailure.attempts, 0), File.id).limit(
+            limit or Config.HASH_BATCH_SIZE
+        ).all()
+        
+        failures = {failure.file_id: failure for failure in HashFailure.query.filter(
+            HashFailure.file_id.in_([file.id for file in files])
+        )} if files else {}
+        
+        hashed = 0
+        for file in files:
+            failure = failures.get(file.id)
+            try:
+                file.file_hash = FileService._calculate_file_hash(file.file_path)
+            except OSError as e:
+                if failure is None:
+                    db.session.add(HashFailure(file_id=file.id, last_error=str(e)))
+                else:
+                    failure.attempts += 1
+                    failure.last_error = str(e)
+                    failure.last_attempt_at = datetime.utcnow()
+                continue
+            if failure is not None:
+                db.session.delete(failure)
+            hashed += 1
+        
+        db.session.commit()
+        return hashed
+    
+    @staticmethod
+    def _calculate_file_hash(file_path):
         """Calculate SHA-256 hash of file"""
         sha256_hash = hashlib.sha256()
         with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
+            for byte_block in iter(lambda: f.read(Config.IO_CHUNK_SIZE), b""):
                 sha256_hash.update(byte_block)
         return sha256_hash.hexdigest()
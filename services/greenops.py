@@ -5,7 +5,8 @@ from sqlalchemy import func
 from extensions import db
 from models.user import User
 from models.file import File
-from models.folder import Folder
+from services.service_context import service_context
+from services.suggestions import suggestion_service
 from config import Config
 
 
@@ -14,7 +15,8 @@ class GreenOpsService:
     
     def __init__(self, user_id):
         self.user_id = user_id
-        self.user = User.query.get(user_id)
+        self.context = service_context(user_id)
+        self.user = self.context.user
     
     def calculate_greenops_score(self):
         """Calculate GreenOps score (0-100)"""
@@ -47,7 +49,7 @@ class GreenOpsService:
             score += 5
         
         # Trash management (10 points)
-        trash_count = File.query.filter_by(user_id=self.user_id, is_deleted=True).count()
+        trash_count = self.context.trash_count()
         if trash_count == 0:
             score += 10
         elif trash_count < 5:
@@ -56,12 +58,8 @@ class GreenOpsService:
             score += 4
         
         # Organization (10 points) - files in folders
-        total_files = File.query.filter_by(user_id=self.user_id, is_deleted=False).count()
-        files_in_folders = File.query.filter(
-            File.user_id == self.user_id,
-            File.is_deleted == False,
-            File.folder_id != None
-        ).count()
+        total_files = self.context.file_count()
+        files_in_folders = total_files - self.context.unfiled_count()
         
         if total_files > 0:
             org_percentage = (files_in_folders / total_files) * 100
@@ -77,56 +75,14 @@ class GreenOpsService:
         return min(score, 100)
     
     def get_suggestions(self):
-        """Get optimization suggestions"""
-        suggestions = []
-        
-        # Storage suggestions
-        percentage = self.user.get_storage_percentage()
-        if percentage > 90:
-            suggestions.append("Critical: Storage almost full. Delete unused files immediately.")
-        elif percentage > 70:
-            suggestions.append("Warning: Storage usage is high. Consider cleanup.")
-        
-        # Trash suggestions
-        trash_count = File.query.filter_by(user_id=self.user_id, is_deleted=True).count()
-        if trash_count > 0:
-            old_trash = self._get_old_trash_count()
-            if old_trash > 0:
-                suggestions.append(f"Empty {old_trash} old files from trash to free up space.")
-        
-        # Duplicate suggestions
-        duplicates = self.find_duplicate_files()
-        if len(duplicates) > 0:
-            total_waste = sum(d['size'] for d in duplicates)
-            waste_mb = total_waste / (1024**2)
-            suggestions.append(f"Remove {len(duplicates)} duplicate file groups to save {waste_mb:.1f} MB.")
-        
-        # Organization suggestions
-        files_without_folder = File.query.filter_by(
-            user_id=self.user_id,
-            folder_id=None,
-            is_deleted=False
-        ).count()
-        if files_without_folder > 10:
-            suggestions.append(f"Organize {files_without_folder} files into folders for better management.")
-        
-        # Eco mode suggestion
-        if not self.user.eco_mode_enabled:
-            suggestions.append("Enable Eco Mode to activate energy-saving features.")
-        
-        # Auto cleanup suggestion
-        if not self.user.auto_cleanup_enabled:
-            suggestions.append("Enable Auto Cleanup to automatically remove old trash files.")
-        
-        # Old files suggestion
-        old_files = self.get_old_files(days=180)
-        if len(old_files) > 5:
-            suggestions.append(f"Archive or delete {len(old_files)} files not accessed in 6 months.")
-        
-        return suggestions
+        """Get optimization suggestions, precomputed by the suggestions job"""
+        return suggestion_service.get(self.user_id)['greenops']
     
     def find_duplicate_files(self):
         """Find duplicate files based on hash"""
+        return self.context.memoize('duplicates', self._find_duplicate_files)
+    
+    def _find_duplicate_files(self):
         # Get files with duplicate hashes
         duplicates_query = db.session.query(
             File.file_hash,
@@ -159,38 +115,44 @@ class GreenOpsService:
         """Get files not accessed in specified days"""
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
-        return File.query.filter(
+        return self.context.memoize(f'old_files:{days}', lambda: File.query.filter(
             File.user_id == self.user_id,
             File.is_deleted == False,
             File.last_accessed < cutoff_date
-        ).all()
+        ).all())
     
     def cleanup_old_trash(self, days=None):
         """Cleanup old trash files"""
+        return self.purge_expired_trash(days=days, user_ids=[self.user_id])
+    
+    @staticmethod
+    def purge_expired_trash(days=None, user_ids=None):
+        """Permanently delete expired trash in bulk
+        
+        Without `user_ids` this purges every user with auto cleanup enabled,
+        which is what the background scheduler runs.
+        """
+        from services.deletion import deletion_service
+        
         if days is None:
             days = Config.AUTO_CLEANUP_DAYS
         
         cutoff_date = datetime.utcnow() - timedelta(days=days)
+        expired = (File.is_deleted == True, File.deleted_at < cutoff_date)
         
-        old_trash_files = File.query.filter(
-            File.user_id == self.user_id,
-            File.is_deleted == True,
-            File.deleted_at < cutoff_date
-        ).all()
-        
-        count = 0
-        for file in old_trash_files:
-            file.hard_delete()
-            count += 1
-        
-        self.user.update_storage_used()
+        query = db.session.query(File.id).filter(*expired)
+        if user_ids is None:
+            query = query.join(User, User.id == File.user_id).filter(User.auto_cleanup_enabled == True)
+        else:
+            query = query.filter(File.user_id.in_(user_ids))
         
-        return count
+        file_ids = [file_id for (file_id,) in query]
+        return deletion_service.hard_delete(file_ids, *expired)['deleted']
     
     def get_storage_optimization_stats(self):
         """Get storage optimization statistics"""
-        total_files = File.query.filter_by(user_id=self.user_id, is_deleted=False).count()
-        trash_files = File.query.filter_by(user_id=self.user_id, is_deleted=True).count()
+        total_files = self.context.file_count()
+        trash_files = self.context.trash_count()
         
         # Calculate potential savings
         trash_size = db.session.query(func.sum(File.size)).filter(
@@ -212,22 +174,12 @@ class GreenOpsService:
     
     def get_file_count(self):
         """Get total file count"""
-        return File.query.filter_by(user_id=self.user_id, is_deleted=False).count()
+        return self.context.file_count()
     
     def get_folder_count(self):
         """Get total folder count"""
-        return Folder.query.filter_by(user_id=self.user_id, is_deleted=False).count()
+        return self.context.folder_count()
     
     def get_trash_count(self):
         """Get trash file count"""
-        return File.query.filter_by(user_id=self.user_id, is_deleted=True).count()
-    
-    def _get_old_trash_count(self):
-        """Get count of old trash files"""
-        cutoff_date = datetime.utcnow() - timedelta(days=Config.AUTO_CLEANUP_DAYS)
-        
-        return File.query.filter(
-            File.user_id == self.user_id,
-            File.is_deleted == True,
-            File.deleted_at < cutoff_date
-        ).count()
+        return self.context.trash_count()
@@ -0,0 +1,141 @@
+"""Intent matching for the AI agent"""
+
+import re
+from collections import deque
+
+
+# Intent -> (phrase, weight). Specific phrases weigh more than generic words,
+# so "how many files use storage" is a file count question, not a storage one.
+# The order breaks ties between equal scores.
+# An intent scores its strongest phrase plus EXTRA_PHRASE_WEIGHT per other
+# phrase, so nested phrases like "clean up" and "clean" do not add up.
+INTENTS = (
+    ('system', (
+        ('cpu', 2), ('memory', 2), ('ram', 2), ('system', 1.5), ('resources', 1.5), ('performance', 1.5),
+        ('server', 1),
+    )),
+    ('energy', (
+        ('energy', 1.5), ('battery', 2), ('power', 1.5), ('energy score', 2),
+    )),
+    ('breakdown', (
+        ('eating', 2), ('breakdown', 2), ('file types', 2), ('file type', 2), ('biggest', 2),
+        ('largest', 2), ('taking up', 2), ('what is using', 2), ('using space', 1.5),
+    )),
+    ('storage', (
+        ('storage', 1), ('space', 1), ('quota', 2), ('how much', 1), ('disk', 1), ('used', 0.5),
+    )),
+    ('file_count', (
+        ('how many files', 3), ('file count', 3), ('number of files', 3), ('count', 1), ('how many', 1),
+    )),
+    ('cleanup', (
+        ('cleanup', 2), ('clean up', 2), ('clean', 1.5), ('cleaning', 1.5), ('optimize', 2),
+        ('free space', 2), ('free up', 2), ('trash', 1), ('delete', 1),
+    )),
+    ('duplicate', (
+        ('duplicate', 2.5), ('same files', 2.5), ('same file', 2.5), ('copies', 1.5), ('copy', 1),
+    )),
+    ('greenops', (
+        ('greenops', 3), ('green', 1), ('eco', 1.5), ('sustainable', 2), ('sustainability', 2),
+        ('carbon', 2), ('score', 0.5),
+    )),
+    ('help', (
+        ('help', 1), ('how to', 1), ('how do i', 1), ('what can you do', 3), ('commands', 1.5),
+    )),
+    ('upload', (
+        ('upload', 1.5), ('add file', 2), ('add files', 2), ('send file', 1.5),
+    )),
+    ('organize', (
+        ('organize', 2), ('organise', 2), ('manage', 1.5), ('folder', 1.5), ('sort', 1), ('structure', 1),
+    )),
+    ('recent', (
+        ('recent', 2), ('latest', 2), ('new', 1), ('last uploaded', 2.5), ('yesterday', 1.5), ('today', 1),
+    )),
+    ('find', (
+        ('where is', 2.5), ('where are', 2.5), ('where did', 2.5), ('find', 2), ('search', 2),
+        ('search for', 2.5), ('locate', 2.5), ('look for', 2), ('looking for', 2),
+    )),
+)
+
+EXTRA_PHRASE_WEIGHT = 0.1
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def normalize(token):
+    """Fold simple plurals so 'files' matches 'file'"""
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [normalize(token) for token in TOKEN.findall(text.lower())]
+
+
+class IntentMatcher:
+    """Score every intent in a single pass over the message
+
+    Phrases are compiled into an Aho-Corasick automaton over word tokens,
+    so matches respect word boundaries ("ram" does not fire on "program")
+    and multi-word phrases cost no more than single words.
+    """
+
+    def __init__(self, intents=INTENTS):
+        self.rank = {intent: i for i, (intent, _) in enumerate(intents)}
+        # Trie nodes: transitions, failure link, (intent, phrase id, weight) outputs
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        phrase_id = 0
+        for intent, phrases in intents:
+            for phrase, weight in phrases:
+                node = 0
+                for token in tokenize(phrase):
+                    if token not in self._goto[node]:
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._output.append([])
+                        self._goto[node][token] = len(self._goto) - 1
+                    node = self._goto[node][token]
+                self._output[node].append((intent, phrase_id, weight))
+                phrase_id += 1
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(token, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def scores(self, message):
+        """Get the score of every intent that matched"""
+        weights = {}
+        seen = set()
+        node = 0
+        for token in tokenize(message):
+            while node and token not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(token, 0)
+            for intent, phrase_id, weight in self._output[node]:
+                if phrase_id not in seen:
+                    seen.add(phrase_id)
+                    weights.setdefault(intent, []).append(weight)
+        return {intent: max(found) + EXTRA_PHRASE_WEIGHT * (len(found) - 1) for intent, found in weights.items()}
+
+    def match(self, message):
+        """Get the best intent for a message, or None"""
+        scores = self.scores(message)
+        if not scores:
+            return None
+        return max(scores, key=lambda intent: (scores[intent], -self.rank[intent]))
+
+
+# Global instance, compiled once per process
+intent_matcher = IntentMatcher()
@@ -0,0 +1,103 @@
+"""Live system stats pushed as Server-Sent Events"""
+
+import json
+import threading
+import time
+from config import Config
+from services.scheduler import scheduler
+from services.system_monitor import system_monitor
+
+
+class LiveStats:
+    """Turn sampler updates into SSE deltas for many subscribers"""
+
+    def __init__(self, max_subscribers=None):
+        self.max_subscribers = max_subscribers or Config.SSE_MAX_SUBSCRIBERS
+        self._slots = threading.BoundedSemaphore(self.max_subscribers)
+        self._lock = threading.Lock()
+        self.subscribers = 0
+
+    def subscribe(self):
+        """Reserve a subscriber slot; False when this worker is full"""
+        if not self._slots.acquire(blocking=False):
+            return False
+        with self._lock:
+            self.subscribers += 1
+        return True
+
+    def unsubscribe(self):
+        with self._lock:
+            self.subscribers -= 1
+        self._slots.release()
+
+    def stream(self, eco_mode_enabled):
+        """Yield SSE messages until the stream's lifetime is over
+
+        The first `stats` event carries the full state, later ones only the
+        fields that changed. `alert` and `alert_cleared` events fire when an
+        alert is raised or goes away. `processes` carries the whole process
+        table and `jobs` the scheduler's queue and job states whenever they
+        change. The subscriber slot must already be held; the caller
+        releases it when the response closes.
+        """
+        state, alerts, processes, jobs, sampled_at = {}, {}, None, None, None
+        deadline = time.monotonic() + Config.SSE_MAX_SECONDS
+        # Clients reconnect on their own when the stream ends
+        yield 'retry: 3000\n\n'
+
+        while time.monotonic() < deadline:
+            snapshot = system_monitor.wait_for_update(sampled_at, timeout=Config.SSE_HEARTBEAT_SECONDS)
+            if snapshot['sampled_at'] == sampled_at:
+                yield ': keepalive\n\n'
+                continue
+            sampled_at = snapshot['sampled_at']
+
+            summary = system_monitor.get_system_summary()
+            current_alerts = {alert['key']: alert for alert in summary.pop('alerts')}
+            summary.pop('timestamp')
+            summary['energy_score'] = system_monitor.calculate_energy_score({
+                'eco_mode_enabled': eco_mode_enabled
+            })
+
+            new_state = _flatten(summary)
+            delta = {key: value for key, value in new_state.items() if state.get(key) != value}
+            state = new_state
+            if delta:
+                yield _event('stats', delta)
+
+            current_processes = system_monitor.get_process_breakdown()
+            if current_processes != processes:
+                yield _event('processes', current_processes)
+            processes = current_processes
+
+            current_jobs = {'queue': scheduler.get_queue_status(), 'jobs': scheduler.get_status()}
+            if current_jobs != jobs:
+                yield _event('jobs', current_jobs)
+            jobs = current_jobs
+
+            for key, alert in current_alerts.items():
+                if key not in alerts:
+                    yield _event('alert', alert)
+            for key in alerts.keys() - current_alerts.keys():
+                yield _event('alert_cleared', {'key': key})
+            alerts = current_alerts
+
+
+def _flatten(data, prefix=''):
+    """Flatten nested dicts into dotted keys"""
+    flat = {}
+    for key, value in data.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f'{name}.'))
+        else:
+            flat[name] = value
+    return flat
+
+
+def _event(name, data):
+    return f'event: {name}\ndata: {json.dumps(data)}\n\n'
+
+
+# Global instance
+live_stats = LiveStats()
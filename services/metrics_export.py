@@ -0,0 +1,237 @@
+"""OpenMetrics exposition of request, storage and system metrics"""
+
+import json
+import os
+import threading
+import time
+from config import Config
+from services.shared_metrics import worker_dir
+from services.system_monitor import system_monitor
+
+
+PREFIX = 'greencloud'
+
+# Upper bounds of the request latency histogram, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+class MetricsExporter:
+    """Cumulative per-endpoint counters that add up across workers
+
+    Each worker keeps its own counters and writes them to a file in the
+    server's worker directory every METRICS_FLUSH_SECONDS. A scrape flushes
+    the serving worker and sums every file, so totals cover all workers.
+    Files of exited workers are kept, which keeps counters monotonic until
+    the server restarts and the directory is cleared.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._endpoints = {}
+        self._pid = None
+        self._thread = None
+
+    def observe(self, blueprint, endpoint, method, status, usage):
+        """Record one finished request"""
+        self._ensure_flusher()
+        duration = usage['wall_s']
+        with self._lock:
+            key = (blueprint, endpoint, method, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+            stats = self._endpoints.get((blueprint, endpoint))
+            if stats is None:
+                stats = self._endpoints[(blueprint, endpoint)] = {
+                    'buckets': [0] * len(LATENCY_BUCKETS),
+                    'count': 0,
+                    'sum': 0.0,
+                    'db_queries': 0,
+                    'bytes_read': 0,
+                    'bytes_written': 0
+                }
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound:
+                    stats['buckets'][i] += 1
+            stats['count'] += 1
+            stats['sum'] += duration
+            stats['db_queries'] += usage['db_queries']
+            stats['bytes_read'] += usage['bytes_read']
+            stats['bytes_written'] += usage['bytes_written']
+
+    def flush(self):
+        """Write this worker's counters to its file"""
+        with self._lock:
+            data = {
+                'requests': [list(key) + [count] for key, count in self._requests.items()],
+                'endpoints': [list(key) + [stats] for key, stats in self._endpoints.items()]
+            }
+        if not data['requests']:
+            return
+
+        directory = worker_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(data, f)
+        os.replace(path + '.tmp', path)
+
+    def collect(self):
+        """Sum the counters of every worker"""
+        self.flush()
+        requests, endpoints = {}, {}
+        directory = worker_dir()
+        names = os.listdir(directory) if os.path.isdir(directory) else []
+
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+
+            for *key, count in data['requests']:
+                requests[tuple(key)] = requests.get(tuple(key), 0) + count
+            for blueprint, endpoint, stats in data['endpoints']:
+                total = endpoints.setdefault((blueprint, endpoint), {
+                    'buckets': [0] * len(LATENCY_BUCKETS), 'count': 0, 'sum': 0.0,
+                    'db_queries': 0, 'bytes_read': 0, 'bytes_written': 0
+                })
+                total['buckets'] = [a + b for a, b in zip(total['buckets'], stats['buckets'])]
+                for field in ('count', 'sum', 'db_queries', 'bytes_read', 'bytes_written'):
+                    total[field] += stats[field]
+
+        return requests, endpoints
+
+    def render(self):
+        """Render every metric in the OpenMetrics text format"""
+        requests, endpoints = self.collect()
+        lines = []
+
+        _family(lines, 'http_requests', 'counter', 'Requests served.')
+        for (blueprint, endpoint, method, status), count in sorted(requests.items()):
+            labels = _labels(blueprint=blueprint, endpoint=endpoint, method=method, status=status)
+            lines.append(f'{PREFIX}_http_requests_total{labels} {count}')
+
+        _family(lines, 'http_request_duration_seconds', 'histogram', 'Request latency.')
+        for (blueprint, endpoint), stats in sorted(endpoints.items()):
+            for bound, count in zip(LATENCY_BUCKETS, stats['buckets']):
+                labels = _labels(blueprint=blueprint, endpoint=endpoint, le=repr(bound))
+                lines.append(f'{PREFIX}_http_request_duration_seconds_bucket{labels} {count}')
+            labels = _labels(blueprint=blueprint, endpoint=endpoint, le='+Inf')
+            lines.append(f'{PREFIX}_http_request_duration_seconds_bucket{labels} {stats["count"]}')
+            labels = _labels(blueprint=blueprint, endpoint=endpoint)
+            lines.append(f'{PREFIX}_http_request_duration_seconds_count{labels} {stats["count"]}')
+            lines.append(f'{PREFIX}_http_request_duration_seconds_sum{labels} {stats["sum"]:.6f}')
+
+        for field, name, help_text in (
+            ('db_queries', 'db_queries', 'Database queries run by requests.'),
+            ('bytes_read', 'storage_read_bytes', 'File bytes read for downloads and previews.'),
+            ('bytes_written', 'storage_written_bytes', 'File bytes written by uploads.'),
+        ):
+            _family(lines, name, 'counter', help_text)
+            for (blueprint, endpoint), stats in sorted(endpoints.items()):
+                labels = _labels(blueprint=blueprint, endpoint=endpoint)
+                lines.append(f'{PREFIX}_{name}_total{labels} {stats[field]}')
+
+        self._render_system(lines)
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def _render_system(self, lines):
+        """Append SystemMonitor gauges"""
+        snapshot = system_monitor.get_snapshot()
+        gauges = (
+            ('cpu_usage_percent', 'Host CPU usage.', snapshot['cpu']),
+            ('memory_usage_percent', 'Host memory usage.', snapshot['memory']['percent']),
+            ('memory_used_bytes', 'Host memory in use.', snapshot['memory']['used_gb'] * 1024**3),
+            ('disk_usage_percent', 'Upload volume usage.', snapshot['disk']['percent']),
+            ('disk_free_bytes', 'Upload volume free space.', snapshot['disk']['free_gb'] * 1024**3),
+            ('uptime_seconds', 'Seconds since the server started.', system_monitor.get_server_uptime()['seconds']),
+        )
+        for name, help_text, value in gauges:
+            _family(lines, name, 'gauge', help_text)
+            lines.append(f'{PREFIX}_{name} {_number(value)}')
+
+        battery = snapshot['battery']
+        if battery:
+            _family(lines, 'battery_percent', 'gauge', 'Battery charge.')
+            lines.append(f'{PREFIX}_battery_percent {_number(battery["percent"])}')
+            _family(lines, 'battery_plugged', 'gauge', '1 when on mains power.')
+            lines.append(f'{PREFIX}_battery_plugged {int(battery["plugged"])}')
+
+        volumes = {name: volume for name, volume in snapshot['volumes'].items() if volume}
+        for name, help_text, field, scale in (
+            ('volume_used_bytes', 'Space used on the upload and database volumes.', 'used_gb', 1024**3),
+            ('volume_size_bytes', 'Size of the upload and database volumes.', 'total_gb', 1024**3),
+            ('volume_read_bytes_per_second', 'Read throughput of each volume.', 'read_bps', 1),
+            ('volume_write_bytes_per_second', 'Write throughput of each volume.', 'write_bps', 1),
+            ('volume_read_iops', 'Read operations per second of each volume.', 'read_iops', 1),
+            ('volume_write_iops', 'Write operations per second of each volume.', 'write_iops', 1),
+            ('volume_latency_seconds', 'Average I/O latency of each volume.', 'latency_ms', 0.001),
+            ('volume_seconds_to_full', 'Projected seconds until each volume is full.', 'time_to_full', 1),
+        ):
+            _family(lines, name, 'gauge', help_text)
+            for volume_name, volume in volumes.items():
+                if volume[field] is not None:
+                    lines.append(f'{PREFIX}_{name}{_labels(volume=volume_name)} {_number(volume[field] * scale)}')
+
+        processes = system_monitor.get_process_breakdown()
+        for name, help_text, field in (
+            ('process_resident_memory_bytes', 'Resident memory of each server process.', 'rss_bytes'),
+            ('process_cpu_percent', 'CPU usage of each server process.', 'cpu'),
+            ('process_open_fds', 'Open file descriptors of each server process.', 'fds'),
+            ('process_threads', 'Threads of each server process.', 'threads'),
+        ):
+            _family(lines, name, 'gauge', help_text)
+            for process in processes:
+                if process[field] is not None:
+                    labels = _labels(pid=str(process['pid']), role=process['role'])
+                    lines.append(f'{PREFIX}_{name}{labels} {_number(process[field])}')
+
+    def _ensure_flusher(self):
+        """Start this worker's flush thread once per process"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # Counters inherited across a fork belong to the parent
+            self._requests, self._endpoints = {}, {}
+            self._thread = threading.Thread(target=self._run, name='greencloud-metrics-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(Config.METRICS_FLUSH_SECONDS)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Metrics flush error: {e}")
+
+
+def _family(lines, name, kind, help_text):
+    lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+    lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _number(value):
+    value = round(float(value), 6)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Global instance
+metrics_exporter = MetricsExporter()
@@ -0,0 +1,227 @@
+"""Fixed-size history of system metric samples"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from config import Config
+
+
+METRICS = ('cpu', 'memory', 'disk')
+
+RANGE_UNITS = {'m': 60, 'h': 3600, 'd': 86400}
+
+
+class SampleRing:
+    """Ring buffer of (timestamp, value) pairs backed by arrays"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array('d', [0.0]) * capacity
+        self.values = array('d', [0.0]) * capacity
+        self.next = 0
+        self.count = 0
+
+    def append(self, timestamp, value):
+        self.times[self.next] = timestamp
+        self.values[self.next] = value
+        self.next = (self.next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def oldest(self):
+        return self.times[(self.next - self.count) % self.capacity] if self.count else None
+
+    def points(self, since):
+        """Get points newer than `since`, oldest first"""
+        start = self.next - self.count
+        return [{'t': self.times[i % self.capacity], 'value': round(self.values[i % self.capacity], 2)}
+                for i in range(start, self.next)
+                if self.times[i % self.capacity] >= since]
+
+
+class RollupRing:
+    """Ring buffer of min/avg/max buckets of a fixed width"""
+
+    def __init__(self, seconds, capacity):
+        self.seconds = seconds
+        self.capacity = capacity
+        self.times = array('d', [0.0]) * capacity
+        self.mins = array('d', [0.0]) * capacity
+        self.avgs = array('d', [0.0]) * capacity
+        self.maxs = array('d', [0.0]) * capacity
+        self.next = 0
+        self.count = 0
+        # Bucket being filled: [start, min, sum, max, samples]
+        self._open = None
+
+    def add(self, timestamp, value):
+        bucket = timestamp - timestamp % self.seconds
+        if self._open is not None and self._open[0] != bucket:
+            self._close()
+        if self._open is None:
+            self._open = [bucket, value, value, value, 1]
+        else:
+            self._open[1] = min(self._open[1], value)
+            self._open[2] += value
+            self._open[3] = max(self._open[3], value)
+            self._open[4] += 1
+
+    def store(self, timestamp, minimum, average, maximum):
+        """Append a closed bucket"""
+        i = self.next
+        self.times[i], self.mins[i], self.avgs[i], self.maxs[i] = timestamp, minimum, average, maximum
+        self.next = (self.next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def points(self, since):
+        """Get buckets newer than `since`, including the open one"""
+        start = self.next - self.count
+        points = [{
+            't': self.times[i % self.capacity],
+            'min': round(self.mins[i % self.capacity], 2),
+            'avg': round(self.avgs[i % self.capacity], 2),
+            'max': round(self.maxs[i % self.capacity], 2)
+        } for i in range(start, self.next) if self.times[i % self.capacity] >= since]
+
+        if self._open is not None and self._open[0] >= since:
+            start_time, minimum, total, maximum, samples = self._open
+            points.append({'t': start_time, 'min': round(minimum, 2),
+                           'avg': round(total / samples, 2), 'max': round(maximum, 2)})
+        return points
+
+    def closed_since(self, since):
+        """Get closed buckets newer than `since` as tuples"""
+        start = self.next - self.count
+        return [(self.times[i % self.capacity], self.mins[i % self.capacity],
+                 self.avgs[i % self.capacity], self.maxs[i % self.capacity])
+                for i in range(start, self.next) if self.times[i % self.capacity] > since]
+
+    def _close(self):
+        start_time, minimum, total, maximum, samples = self._open
+        self.store(start_time, minimum, total / samples, maximum)
+        self._open = None
+
+
+class MetricsHistory:
+    """Raw samples plus 1 minute and 1 hour rollups for each metric
+
+    All buffers are preallocated, so memory use is fixed no matter how
+    long the server runs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.raw = {metric: SampleRing(Config.HISTORY_RAW_POINTS) for metric in METRICS}
+        self.rollups = {
+            'minute': {metric: RollupRing(60, Config.HISTORY_MINUTE_POINTS) for metric in METRICS},
+            'hour': {metric: RollupRing(3600, Config.HISTORY_HOUR_POINTS) for metric in METRICS},
+        }
+        self._persisted_until = {resolution: 0.0 for resolution in self.rollups}
+
+    def record(self, snapshot):
+        """Add one sampler snapshot"""
+        values = {
+            'cpu': snapshot['cpu'],
+            'memory': snapshot['memory']['percent'],
+            'disk': snapshot['disk']['percent']
+        }
+        timestamp = snapshot['sampled_at']
+
+        with self._lock:
+            for metric, value in values.items():
+                self.raw[metric].append(timestamp, value)
+                for rings in self.rollups.values():
+                    rings[metric].add(timestamp, value)
+
+    def query(self, metric, range_seconds):
+        """Get points for a metric at the finest resolution covering the range"""
+        if metric not in METRICS:
+            raise ValueError(f'Unknown metric: {metric}')
+
+        since = time.time() - range_seconds
+        with self._lock:
+            raw = self.raw[metric]
+            oldest = raw.oldest()
+            raw_covers_range = oldest is not None and oldest <= since
+            if raw_covers_range or range_seconds <= raw.capacity * Config.METRICS_SAMPLE_INTERVAL:
+                return {'resolution': 'raw', 'points': raw.points(since)}
+
+            if range_seconds <= Config.HISTORY_MINUTE_POINTS * 60:
+                return {'resolution': 'minute', 'points': self.rollups['minute'][metric].points(since)}
+
+            return {'resolution': 'hour', 'points': self.rollups['hour'][metric].points(since)}
+
+    def persist(self, path=None):
+        """Write closed rollup buckets to SQLite"""
+        rows = []
+        with self._lock:
+            for resolution, rings in self.rollups.items():
+                since = self._persisted_until[resolution]
+                for metric, ring in rings.items():
+                    for bucket in ring.closed_since(since):
+                        rows.append((metric, resolution) + bucket)
+                        self._persisted_until[resolution] = max(self._persisted_until[resolution], bucket[0])
+
+        if rows:
+            conn = self._connect(path)
+            try:
+                with conn:
+                    conn.executemany('INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?, ?, ?)', rows)
+            finally:
+                conn.close()
+        return len(rows)
+
+    def load(self, path=None):
+        """Restore persisted rollup buckets that still fit in the buffers"""
+        path = path or Config.HISTORY_PATH
+        if not os.path.exists(path):
+            return 0
+
+        loaded = 0
+        conn = self._connect(path)
+        try:
+            with conn, self._lock:
+                for resolution, rings in self.rollups.items():
+                    for metric, ring in rings.items():
+                        rows = conn.execute(
+                            'SELECT t, min, avg, max FROM history WHERE metric = ? AND resolution = ? '
+                            'ORDER BY t DESC LIMIT ?', (metric, resolution, ring.capacity)
+                        ).fetchall()
+                        for row in reversed(rows):
+                            ring.store(*row)
+                        loaded += len(rows)
+                        if rows:
+                            self._persisted_until[resolution] = max(self._persisted_until[resolution], rows[0][0])
+
+                # Keep the table bounded like the buffers
+                for resolution, rings in self.rollups.items():
+                    ring = next(iter(rings.values()))
+                    conn.execute('DELETE FROM history WHERE resolution = ? AND t < ?',
+                                 (resolution, time.time() - ring.capacity * ring.seconds))
+        finally:
+            conn.close()
+        return loaded
+
+    def _connect(self, path=None):
+        path = path or Config.HISTORY_PATH
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5)
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS history (metric TEXT, resolution TEXT, t REAL, '
+            'min REAL, avg REAL, max REAL, PRIMARY KEY (metric, resolution, t))'
+        )
+        return conn
+
+
+def parse_range(value, default='1h'):
+    """Parse a range like '30m', '6h' or '7d' into seconds"""
+    match = re.fullmatch(r'(\d+)([mhd])', (value or default).strip().lower())
+    if not match:
+        raise ValueError(f'Invalid range: {value}')
+    return int(match.group(1)) * RANGE_UNITS[match.group(2)]
+
+
+# Global instance
+metrics_history = MetricsHistory()
@@ -0,0 +1,74 @@
+"""Password hashing on a small bounded pool"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+from config import Config
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password hashes are already in flight"""
+
+
+class PasswordHasher:
+    """Run password hashes on a few dedicated threads
+
+    Hashing is slow on purpose, so running it inline lets a login burst
+    occupy every request thread. Hashes run on PASSWORD_HASH_WORKERS
+    threads per process with at most PASSWORD_HASH_QUEUE more waiting;
+    anything beyond that is rejected at once. hashlib releases the GIL
+    while hashing, so other requests keep being served meanwhile.
+    """
+
+    def __init__(self, workers=None, queue=None):
+        self.workers = workers or Config.PASSWORD_HASH_WORKERS
+        self.queue = Config.PASSWORD_HASH_QUEUE if queue is None else queue
+        self._slots = None
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def hash(self, password):
+        """Hash a password with the configured method"""
+        return self._run(generate_password_hash, password, method=Config.PASSWORD_HASH_METHOD)
+
+    def verify(self, password_hash, password):
+        """Check a password against its hash"""
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Check whether a hash was made with other parameters than configured"""
+        return password_hash.split('$', 1)[0] != Config.PASSWORD_HASH_METHOD
+
+    def _run(self, func, *args, **kwargs):
+        self._ensure_pool()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            future = self._pool.submit(func, *args, **kwargs)
+        except Exception:
+            slots.release()
+            raise
+        # The slot stays taken until the hash finishes, even if we stop waiting
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=Config.PASSWORD_HASH_TIMEOUT)
+        except TimeoutError:
+            raise PasswordHasherBusy()
+
+    def _ensure_pool(self):
+        """Create the pool once per process; threads do not survive a fork"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._slots = threading.BoundedSemaphore(self.workers + self.queue)
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='greencloud-hash')
+            self._pid = os.getpid()
+
+
+# Global instance
+password_hasher = PasswordHasher()
@@ -0,0 +1,220 @@
+"""On-demand sampling profiler for live workers"""
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from flask import request
+from config import Config
+from services.shared_metrics import worker_dir
+
+
+class SamplingProfiler:
+    """Sample request thread stacks in every worker for a few seconds
+
+    An admin starts a session by writing a control file. A watcher thread
+    in each worker notices it, samples the stacks of threads that are
+    serving requests every PROFILER_INTERVAL_MS, and writes collapsed
+    stacks to a result file when the session ends. While no session runs,
+    the only cost is one stat() per worker every PROFILER_POLL_SECONDS.
+    """
+
+    def __init__(self):
+        self.session = None
+        self._requests = {}
+        self._seen = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Track which endpoint each thread serves while sampling"""
+        app.before_request(self._start_request)
+        app.teardown_request(self._finish_request)
+
+    def start(self, seconds):
+        """Start a session in every worker and return it"""
+        seconds = max(1, min(int(seconds), Config.PROFILER_MAX_SECONDS))
+        now = time.time()
+        session = {
+            'id': uuid.uuid4().hex[:12],
+            'started': now,
+            'until': now + seconds,
+            'interval': Config.PROFILER_INTERVAL_MS / 1000
+        }
+
+        directory = _profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, 'control.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(session, f)
+        os.replace(path + '.tmp', path)
+
+        # This worker starts right away instead of on its next poll
+        self._ensure_watcher()
+        self._check_control()
+        return session
+
+    def get_result(self, session_id, limit=20):
+        """Merge the workers' samples, or None for an unknown session"""
+        session = _read_json(os.path.join(_profile_dir(), 'control.json'))
+        stacks = self._collect(session_id)
+        if stacks is None:
+            return None
+
+        endpoints, inclusive, exclusive = Counter(), Counter(), Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(';')
+            endpoints[frames[0]] += count
+            exclusive[frames[-1]] += count
+            for frame in set(frames[1:]):
+                inclusive[frame] += count
+
+        total = sum(stacks.values())
+        running = session is not None and session['id'] == session_id and \
+            time.time() < session['until'] + 2 * Config.PROFILER_POLL_SECONDS
+        return {
+            'id': session_id,
+            'status': 'running' if running else 'done',
+            'workers': self._worker_count(session_id),
+            'samples': total,
+            'endpoints': [{'endpoint': endpoint, 'samples': count} for endpoint, count in endpoints.most_common()],
+            'top': [{
+                'function': function,
+                'self': count,
+                'self_percent': round(count / total * 100, 1),
+                'total': inclusive[function],
+                'total_percent': round(inclusive[function] / total * 100, 1)
+            } for function, count in exclusive.most_common(limit)]
+        }
+
+    def get_collapsed(self, session_id):
+        """Get merged samples in collapsed-stack format for flamegraph tools"""
+        stacks = self._collect(session_id)
+        if stacks is None:
+            return None
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(stacks.items()))
+
+    def _collect(self, session_id):
+        directory = _profile_dir()
+        prefix = f'{session_id}-'
+        names = [name for name in os.listdir(directory) if name.startswith(prefix)] \
+            if os.path.isdir(directory) else []
+        session = _read_json(os.path.join(directory, 'control.json'))
+        if not names and (session is None or session['id'] != session_id):
+            return None
+
+        stacks = Counter()
+        for name in names:
+            stacks.update(_read_json(os.path.join(directory, name)) or {})
+        return stacks
+
+    def _worker_count(self, session_id):
+        directory = _profile_dir()
+        return sum(1 for name in os.listdir(directory) if name.startswith(f'{session_id}-'))
+
+    def _start_request(self):
+        self._ensure_watcher()
+        if self.session is not None:
+            self._requests[threading.get_ident()] = request.endpoint or 'unknown'
+
+    def _finish_request(self, exc=None):
+        if self._requests:
+            self._requests.pop(threading.get_ident(), None)
+
+    def _ensure_watcher(self):
+        """Start this worker's control file watcher once per process"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.session = None
+            self._requests = {}
+            threading.Thread(target=self._watch, name='greencloud-profiler-watch', daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(Config.PROFILER_POLL_SECONDS)
+            try:
+                self._check_control()
+            except Exception as e:
+                print(f"Profiler control error: {e}")
+
+    def _check_control(self):
+        """Start sampling when a new session appears"""
+        path = os.path.join(_profile_dir(), 'control.json')
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if mtime == self._seen or self.session is not None:
+                return
+            self._seen = mtime
+            session = _read_json(path)
+            if session is None or session['until'] <= time.time():
+                return
+            self.session = session
+        threading.Thread(target=self._sample, args=(session,), name='greencloud-profiler', daemon=True).start()
+
+    def _sample(self, session):
+        """Sample request threads until the session ends, then save"""
+        stacks = Counter()
+        try:
+            while time.time() < session['until']:
+                frames = sys._current_frames()
+                for thread_id, endpoint in list(self._requests.items()):
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[_collapse(endpoint, frame)] += 1
+                del frames
+                time.sleep(session['interval'])
+        finally:
+            self.session = None
+            self._requests.clear()
+
+        path = os.path.join(_profile_dir(), f"{session['id']}-{os.getpid()}.json")
+        with open(path + '.tmp', 'w') as f:
+            json.dump(stacks, f)
+        os.replace(path + '.tmp', path)
+
+
+def _profile_dir():
+    return os.path.join(worker_dir(), 'profiles')
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _collapse(endpoint, frame):
+    """Render a stack root-first as 'endpoint;func (file:line);...'"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    names.append(endpoint)
+    return ';'.join(reversed(names))
+
+
+def _short_path(filename):
+    """Trim paths to the project or to the package inside site-packages"""
+    if filename.startswith(Config.BASE_DIR):
+        return os.path.relpath(filename, Config.BASE_DIR)
+    marker = 'site-packages' + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+# Global instance
+sampling_profiler = SamplingProfiler()
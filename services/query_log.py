@@ -0,0 +1,140 @@
+"""Slow query log with query plan capture"""
+
+import os
+import re
+import threading
+import time
+from collections import Counter
+from flask import request, has_request_context
+from config import Config
+
+
+# Statements that are safe to EXPLAIN without running them
+EXPLAINABLE = ('select', 'with', 'update', 'delete')
+
+
+class SlowQueryLog:
+    """Keep the worst offending statements of this worker
+
+    Statements over SLOW_QUERY_MS are grouped by their SQL text, which
+    SQLAlchemy already renders with placeholders. Each group records how
+    often and how slowly it ran, the shape of its parameters, the routes
+    that issued it and its query plan, captured the first time it is slow.
+    At most SLOW_QUERY_LIMIT groups are kept; when full, the group with the
+    least total time is dropped.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit or Config.SLOW_QUERY_LIMIT
+        self.threshold = Config.SLOW_QUERY_MS / 1000
+        self._queries = {}
+        self._lock = threading.Lock()
+
+    def record(self, cursor, dialect, statement, parameters, executemany, elapsed):
+        """Log one slow statement"""
+        sql = re.sub(r'\s+', ' ', statement).strip()
+        route = (request.endpoint or 'unknown') if has_request_context() else threading.current_thread().name
+        shape = _parameter_shape(parameters, executemany)
+        print(f"Slow query ({elapsed * 1000:.1f} ms) from {route}: {sql[:200]} params={shape}")
+
+        with self._lock:
+            entry = self._queries.get(sql)
+            if entry is None:
+                if len(self._queries) >= self.limit:
+                    del self._queries[min(self._queries, key=lambda key: self._queries[key]['total_s'])]
+                entry = self._queries[sql] = {
+                    'statement': sql,
+                    'count': 0,
+                    'total_s': 0.0,
+                    'max_s': 0.0,
+                    'routes': Counter(),
+                    'parameters': shape,
+                    'plan': None
+                }
+            entry['count'] += 1
+            entry['total_s'] += elapsed
+            entry['max_s'] = max(entry['max_s'], elapsed)
+            entry['last_seen'] = time.time()
+            entry['routes'][route] += 1
+            explain = entry['plan'] is None
+
+        if explain:
+            plan = _explain(cursor, dialect, statement, parameters[0] if executemany else parameters)
+            with self._lock:
+                entry['plan'] = plan
+
+    def get_top(self, limit=20):
+        """Get the statements with the most total time"""
+        with self._lock:
+            entries = sorted(self._queries.values(), key=lambda entry: entry['total_s'], reverse=True)[:limit]
+            return [{
+                'statement': entry['statement'],
+                'count': entry['count'],
+                'total_ms': round(entry['total_s'] * 1000, 1),
+                'avg_ms': round(entry['total_s'] / entry['count'] * 1000, 1),
+                'max_ms': round(entry['max_s'] * 1000, 1),
+                'routes': [route for route, _ in entry['routes'].most_common(3)],
+                'parameters': entry['parameters'],
+                'plan': entry['plan']
+            } for entry in entries]
+
+    def get_summary(self, limit=20):
+        return {
+            'pid': os.getpid(),
+            'threshold_ms': Config.SLOW_QUERY_MS,
+            'queries': self.get_top(limit)
+        }
+
+    def clear(self):
+        with self._lock:
+            self._queries = {}
+
+
+def _parameter_shape(parameters, executemany):
+    """Describe parameters by type without logging their values"""
+    if executemany:
+        rows = list(parameters)
+        return f'{len(rows)} x {_parameter_shape(rows[0], False)}' if rows else '0 rows'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{name}: {type(value).__name__}' for name, value in parameters.items()) + '}'
+    if isinstance(parameters, (list, tuple)):
+        types = [type(value).__name__ for value in parameters[:10]]
+        if len(parameters) > 10:
+            types.append(f'... {len(parameters)} total')
+        return '(' + ', '.join(types) + ')'
+    return type(parameters).__name__
+
+
+def _explain(cursor, dialect, statement, parameters):
+    """Get the query plan on the same DBAPI connection, bypassing engine events"""
+    if not statement.lstrip().lower().startswith(EXPLAINABLE):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect == 'sqlite' else 'EXPLAIN ' if dialect == 'postgresql' else None
+    if prefix is None:
+        return None
+
+    explain_cursor = cursor.connection.cursor()
+    # A failed statement aborts the whole transaction on Postgres; contain it
+    savepoint = dialect == 'postgresql'
+    try:
+        if savepoint:
+            explain_cursor.execute('SAVEPOINT slow_query_explain')
+        explain_cursor.execute(prefix + statement, parameters)
+        rows = explain_cursor.fetchall()
+        if savepoint:
+            explain_cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+    except Exception as e:
+        if savepoint:
+            explain_cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+        return f'EXPLAIN failed: {e}'
+    finally:
+        explain_cursor.close()
+
+    if dialect == 'sqlite':
+        # (id, parent, notused, detail)
+        return '\n'.join(row[-1] for row in rows)
+    return '\n'.join(row[0] for row in rows)
+
+
+# Global instance
+slow_query_log = SlowQueryLog()
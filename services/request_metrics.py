@@ -0,0 +1,174 @@
+"""Per-request resource accounting for GreenOps"""
+
+import threading
+import time
+from collections import deque
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import Config
+from services.metrics_export import metrics_exporter
+from services.query_log import slow_query_log
+
+
+FIELDS = ('requests', 'wall_s', 'cpu_s', 'db_s', 'db_queries', 'bytes_read', 'bytes_written', 'energy_j')
+
+
+class RequestMetrics:
+    """Measure each request and aggregate per endpoint and per user"""
+
+    def __init__(self, window_minutes=Config.REQUEST_METRICS_WINDOW_MINUTES):
+        self.window_minutes = window_minutes
+        self._buckets = deque(maxlen=window_minutes)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Register request and database hooks"""
+        app.before_request(self._start_request)
+        app.after_request(self._record_status)
+        app.teardown_request(self._finish_request)
+
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def add_io(self, read=0, written=0):
+        """Attribute storage bytes to the current request"""
+        usage = _current_usage()
+        if usage is not None:
+            usage['bytes_read'] += read
+            usage['bytes_written'] += written
+
+    def estimate_energy(self, cpu_s, bytes_moved):
+        """Estimate energy in joules from CPU time and storage traffic"""
+        return cpu_s * Config.ENERGY_CPU_WATTS + (bytes_moved / (1024**2)) * Config.ENERGY_JOULES_PER_MB
+
+    def get_summary(self, minutes=None, limit=10):
+        """Get the top endpoints and users over the last `minutes`"""
+        minutes = min(minutes or self.window_minutes, self.window_minutes)
+        oldest = int(time.time() // 60) - minutes + 1
+
+        endpoints, users = {}, {}
+        with self._lock:
+            for bucket in self._buckets:
+                if bucket['minute'] < oldest:
+                    continue
+                _merge(endpoints, bucket['endpoints'])
+                _merge(users, bucket['users'])
+
+        totals = _empty()
+        for stats in endpoints.values():
+            for field in FIELDS:
+                totals[field] += stats[field]
+
+        return {
+            'minutes': minutes,
+            'totals': _rounded(totals),
+            'endpoints': _top(endpoints, limit),
+            'users': _top(users, limit)
+        }
+
+    def _start_request(self):
+        """Snapshot counters at request start"""
+        g._request_usage = {
+            'wall_start': time.perf_counter(),
+            'cpu_start': time.thread_time(),
+            'db_s': 0.0,
+            'db_queries': 0,
+            'bytes_read': 0,
+            'bytes_written': 0
+        }
+
+    def _record_status(self, response):
+        usage = _current_usage()
+        if usage is not None:
+            usage['status'] = response.status_code
+        return response
+
+    def _finish_request(self, exc=None):
+        """Close the measurement and add it to the current bucket"""
+        usage = g.pop('_request_usage', None)
+        if usage is None:
+            return
+
+        usage['wall_s'] = time.perf_counter() - usage.pop('wall_start')
+        usage['cpu_s'] = time.thread_time() - usage.pop('cpu_start')
+        usage['energy_j'] = self.estimate_energy(
+            usage['cpu_s'], usage['bytes_read'] + usage['bytes_written']
+        )
+
+        endpoint = request.endpoint or 'unknown'
+        status = usage.pop('status', 500) if exc is None else 500
+        metrics_exporter.observe(request.blueprint or 'app', endpoint, request.method, status, usage)
+        usage.pop('status', None)
+        usage['requests'] = 1
+
+        # Read the user only if flask_login already loaded it for this request
+        user = g.get('_login_user')
+        user_id = user.id if user is not None and user.is_authenticated else None
+
+        minute = int(time.time() // 60)
+        with self._lock:
+            if not self._buckets or self._buckets[-1]['minute'] != minute:
+                self._buckets.append({'minute': minute, 'endpoints': {}, 'users': {}})
+            bucket = self._buckets[-1]
+            _add(bucket['endpoints'].setdefault(endpoint, _empty()), usage)
+            if user_id is not None:
+                _add(bucket['users'].setdefault(user_id, _empty()), usage)
+
+
+def _current_usage():
+    """Get the usage record of the active request, if any"""
+    if not has_request_context():
+        return None
+    return g.get('_request_usage')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_start'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('query_start', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+
+    usage = _current_usage()
+    if usage is not None:
+        usage['db_s'] += elapsed
+        usage['db_queries'] += 1
+
+    if elapsed >= slow_query_log.threshold:
+        try:
+            slow_query_log.record(cursor, conn.dialect.name, statement, parameters, executemany, elapsed)
+        except Exception as e:
+            print(f"Slow query log error: {e}")
+
+
+def _empty():
+    return dict.fromkeys(FIELDS, 0)
+
+
+def _add(stats, usage):
+    for field in FIELDS:
+        stats[field] += usage[field]
+
+
+def _merge(target, source):
+    for key, stats in source.items():
+        _add(target.setdefault(key, _empty()), stats)
+
+
+def _rounded(stats):
+    return {field: round(value, 4) if isinstance(value, float) else value for field, value in stats.items()}
+
+
+def _top(groups, limit):
+    ranked = sorted(groups.items(), key=lambda item: item[1]['energy_j'], reverse=True)[:limit]
+    return [dict(_rounded(stats), key=key,
+                 avg_ms=round(stats['wall_s'] / stats['requests'] * 1000, 2)) for key, stats in ranked]
+
+
+# Global instance
+request_metrics = RequestMetrics()
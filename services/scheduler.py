@@ -0,0 +1,287 @@
+"""Background scheduler for periodic GreenOps maintenance"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import psutil
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows: every process runs the jobs
+    fcntl = None
+
+
+# Dispatch order; low priority jobs also wait while the host is busy
+PRIORITIES = ('normal', 'low')
+
+
+class Scheduler:
+    """Run registered jobs periodically on a small pool of worker threads
+
+    The scheduler thread only decides what is due; jobs run on a bounded
+    pool whose threads have lowered CPU and IO priority. Low priority jobs
+    are held in the queue while the energy level is red or the host runs on
+    battery, for at most SCHEDULER_MAX_DEFER_MINUTES.
+
+    Every worker runs a scheduler thread, but only the one holding an
+    exclusive flock on SCHEDULER_LOCK_PATH queues jobs. The others retry
+    the lock each tick, so one takes over when the leader exits.
+    """
+
+    def __init__(self, tick=1.0, workers=None):
+        self.app = None
+        self.tick = tick
+        self.workers = workers or Config.SCHEDULER_WORKERS
+        self.jobs = []
+        self.deferred_reason = None
+        self._queue = []
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = None
+        self._pid = None
+        self._lock_file = None
+
+    def add_job(self, name, func, interval, delay=None, priority='normal'):
+        """Register a job to run every `interval` seconds"""
+        if priority not in PRIORITIES:
+            raise ValueError(f'Unknown priority: {priority}')
+        with self._lock:
+            if any(job['name'] == name for job in self.jobs):
+                return
+            self.jobs.append({
+                'name': name,
+                'func': func,
+                'interval': interval,
+                'priority': priority,
+                'delay': interval if delay is None else delay,
+                'next_run': time.monotonic() + (interval if delay is None else delay),
+                'queued_at': None,
+                'last_run': None,
+                'last_error': None,
+                'runs': 0
+            })
+
+    def init_app(self, app):
+        """Bind to the application; the thread starts in the process serving requests
+
+        Starting it here would run the jobs in the gunicorn master when the
+        app is preloaded, so each worker starts its own from post_worker_init,
+        or on its first request when served some other way.
+        """
+        self.app = app
+        app.before_request(self.ensure_running)
+
+    def ensure_running(self):
+        """Start the scheduler in this process if enabled and not started here yet"""
+        if self._pid == os.getpid() or self.app is None:
+            return
+        if self.app.config.get('SCHEDULER_ENABLED', True):
+            self.start()
+
+    def start(self):
+        """Start the scheduler thread if it is not running"""
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # A forked process inherits the job table but not the threads
+                self._pid = os.getpid()
+                # An inherited descriptor would share the parent's lock
+                self._lock_file = None
+                self._pool = None
+                self._queue = []
+                self._running = set()
+                now = time.monotonic()
+                for job in self.jobs:
+                    job['next_run'] = now + job['delay']
+                    job['queued_at'] = None
+            self._stop.clear()
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='greencloud-job',
+                                                initializer=_lower_priority)
+            self._thread = threading.Thread(target=self._run, name='greencloud-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the scheduler thread"""
+        self._stop.set()
+
+    def run_job(self, name):
+        """Run a job immediately, outside its schedule"""
+        job = next((job for job in self.jobs if job['name'] == name), None)
+        if job is None:
+            raise KeyError(name)
+        return self._execute(job)
+
+    def get_status(self):
+        """Get job status for the monitor page"""
+        with self._lock:
+            return [{
+                'name': job['name'],
+                'interval': job['interval'],
+                'priority': job['priority'],
+                'state': self._state(job),
+                'runs': job['runs'],
+                'last_run': job['last_run'].isoformat() if job['last_run'] else None,
+                'last_error': job['last_error']
+            } for job in self.jobs]
+
+    @property
+    def is_leader(self):
+        """Whether this process runs the scheduled jobs"""
+        return self._lock_file is not None or fcntl is None
+
+    def get_queue_status(self):
+        """Get queue depth and pool usage"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'running': len(self._running),
+                'queued': len(self._queue),
+                'deferred_reason': self.deferred_reason if self._queue else None,
+                'leader': self.is_leader,
+                'leader_pid': os.getpid() if self.is_leader else _lock_owner()
+            }
+
+    def _state(self, job):
+        if job['name'] in self._running:
+            return 'running'
+        if job in self._queue:
+            return 'deferred' if job['priority'] == 'low' and self.deferred_reason else 'queued'
+        return 'idle'
+
+    def _run(self):
+        """Scheduler loop"""
+        while not self._stop.wait(self.tick):
+            if not self._acquire_leadership():
+                continue
+            now = time.monotonic()
+            with self._lock:
+                for job in self.jobs:
+                    if job['next_run'] > now:
+                        continue
+                    job['next_run'] = now + job['interval']
+                    # A job still queued or running is not queued twice
+                    if job['name'] not in self._running and job not in self._queue:
+                        job['queued_at'] = now
+                        self._queue.append(job)
+
+            if self._queue:
+                self._dispatch(now)
+
+    def _acquire_leadership(self):
+        """Try to become the single process that runs the jobs"""
+        if self.is_leader:
+            return True
+        try:
+            lock_file = open(Config.SCHEDULER_LOCK_PATH, 'a+')
+        except OSError as e:
+            print(f"Could not open scheduler lock: {e}")
+            return False
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        lock_file.truncate(0)
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file
+        # Jobs were not run while another worker led; restart their clocks
+        now = time.monotonic()
+        with self._lock:
+            for job in self.jobs:
+                job['next_run'] = now + job['delay']
+        return True
+
+    def _dispatch(self, now):
+        """Hand queued jobs to the pool while there are free workers"""
+        reason = self._defer_reason() if any(job['priority'] == 'low' for job in self._queue) else None
+        max_defer = Config.SCHEDULER_MAX_DEFER_MINUTES * 60
+
+        ready = []
+        with self._lock:
+            self.deferred_reason = reason
+            for job in sorted(self._queue, key=lambda job: (PRIORITIES.index(job['priority']), job['queued_at'])):
+                if len(self._running) >= self.workers:
+                    break
+                if job['priority'] == 'low' and reason and now - job['queued_at'] < max_defer:
+                    continue
+                self._queue.remove(job)
+                self._running.add(job['name'])
+                ready.append(job)
+
+        for job in ready:
+            self._pool.submit(self._work, job)
+
+    def _defer_reason(self):
+        """Why low priority work should wait right now, or None"""
+        from services.system_monitor import system_monitor
+
+        try:
+            if system_monitor.get_energy_level()[0] == 'red':
+                return 'high resource usage'
+            battery = system_monitor.get_battery_info()
+            if battery and not battery['plugged']:
+                return 'running on battery'
+        except Exception as e:
+            print(f"Scheduler load check failed: {e}")
+        return None
+
+    def _work(self, job):
+        try:
+            self._execute(job)
+        finally:
+            with self._lock:
+                self._running.discard(job['name'])
+
+    def _execute(self, job):
+        """Run a single job inside an application context"""
+        from extensions import db
+
+        with self.app.app_context():
+            try:
+                result = job['func']()
+                job['last_error'] = None
+                return result
+            except Exception as e:
+                db.session.rollback()
+                job['last_error'] = str(e)
+                print(f"Scheduled job '{job['name']}' failed: {e}")
+            finally:
+                job['runs'] += 1
+                job['last_run'] = datetime.utcnow()
+
+
+def _lock_owner():
+    """Pid of the process that runs the jobs, if known"""
+    try:
+        with open(Config.SCHEDULER_LOCK_PATH) as lock_file:
+            return int(lock_file.read().strip() or 0) or None
+    except (OSError, ValueError):
+        return None
+
+
+def _lower_priority():
+    """Drop the calling pool thread to low CPU and idle IO priority"""
+    # Both calls act on a single thread only on Linux; elsewhere they would
+    # change the whole process, so leave priorities alone there
+    if not sys.platform.startswith('linux'):
+        return
+    thread_id = threading.get_native_id()
+    try:
+        os.setpriority(os.PRIO_PROCESS, thread_id, Config.SCHEDULER_NICE)
+        psutil.Process(thread_id).ionice(psutil.IOPRIO_CLASS_IDLE)
+    except (OSError, psutil.Error) as e:
+        print(f"Could not lower job thread priority: {e}")
+
+
+# Global instance
+scheduler = Scheduler()
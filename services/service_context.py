@@ -0,0 +1,90 @@
+"""Request-scoped data shared by the services working for one user"""
+
+from flask import g, has_app_context, has_request_context
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from extensions import db
+from models.user import User
+from models.file import File
+from models.folder import Folder
+
+
+class ServiceContext:
+    """One user row and memoized aggregates for the current request
+
+    FileService, GreenOpsService and AIAgent each take a user id. Services
+    built for the same user during a request share a context, so the user
+    is taken from current_user instead of being looked up again, and counts
+    such as trash files or duplicate groups run once however many services
+    ask for them. Any flush, commit or rollback drops the memoized results,
+    so nobody reads counts from before their own changes.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._user = None
+        self._memo = {}
+
+    @property
+    def user(self):
+        if self._user is None:
+            if has_request_context() and current_user.is_authenticated and current_user.id == self.user_id:
+                self._user = current_user._get_current_object()
+            else:
+                self._user = db.session.get(User, self.user_id)
+        return self._user
+
+    def memoize(self, name, compute):
+        """Get a result computed once until the data changes"""
+        if name not in self._memo:
+            self._memo[name] = compute()
+        return self._memo[name]
+
+    def clear(self):
+        self._memo = {}
+
+    def file_count(self):
+        """Active files of the user"""
+        return self.memoize('file_count', lambda: File.query.filter_by(
+            user_id=self.user_id, is_deleted=False
+        ).count())
+
+    def folder_count(self):
+        """Active folders of the user"""
+        return self.memoize('folder_count', lambda: Folder.query.filter_by(
+            user_id=self.user_id, is_deleted=False
+        ).count())
+
+    def trash_count(self):
+        """Files of the user in trash"""
+        return self.memoize('trash_count', lambda: File.query.filter_by(
+            user_id=self.user_id, is_deleted=True
+        ).count())
+
+    def unfiled_count(self):
+        """Active files of the user outside any folder"""
+        return self.memoize('unfiled_count', lambda: File.query.filter_by(
+            user_id=self.user_id, folder_id=None, is_deleted=False
+        ).count())
+
+
+def service_context(user_id):
+    """Get the user's context for the current app context"""
+    if not has_app_context():
+        return ServiceContext(user_id)
+    contexts = g.setdefault('service_contexts', {})
+    if user_id not in contexts:
+        contexts[user_id] = ServiceContext(user_id)
+    return contexts[user_id]
+
+
+def _clear_memos(session, *args):
+    if has_app_context():
+        for context in g.get('service_contexts', {}).values():
+            context.clear()
+
+
+event.listen(Session, 'after_flush', _clear_memos)
+event.listen(Session, 'after_commit', _clear_memos)
+event.listen(Session, 'after_rollback', _clear_memos)
@@ -0,0 +1,319 @@
+"""Shared-memory metrics segment for all server workers"""
+
+import mmap
+import os
+import psutil
+import shutil
+import struct
+import tempfile
+import time
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows: every process samples for itself
+    fcntl = None
+
+
+MAGIC = b'GCMS'
+VERSION = 2
+SEGMENT_SIZE = 64 * 1024
+
+# magic, version, sequence, start_time, sampler_pid
+HEADER = struct.Struct('<4sIQdq')
+
+# Volumes the app writes to, and what is tracked for each
+VOLUMES = ('uploads', 'database')
+VOLUME_FIELDS = (
+    'percent', 'used_gb', 'total_gb', 'free_gb',
+    'read_bps', 'write_bps', 'read_iops', 'write_iops', 'latency_ms', 'time_to_full',
+)
+
+SNAPSHOT_FIELDS = (
+    'cpu',
+    'memory.percent', 'memory.used_gb', 'memory.total_gb', 'memory.available_gb',
+    'disk.percent', 'disk.used_gb', 'disk.total_gb', 'disk.free_gb',
+    'battery.percent', 'battery.plugged', 'battery.time_left',
+    'sampled_at',
+) + tuple(f'volumes.{volume}.{field}' for volume in VOLUMES for field in VOLUME_FIELDS)
+SNAPSHOT = struct.Struct('<' + 'd' * len(SNAPSHOT_FIELDS))
+SNAPSHOT_OFFSET = HEADER.size
+
+# A reader gives up after this many torn reads, e.g. when a sampler died mid-write
+READ_RETRIES = 20
+READ_RETRY_DELAY = 0.001
+
+# Marks a missing battery or unlimited time left
+NONE = -1.0
+
+# One slot per worker, written only by that worker: pid, requests served
+MAX_WORKERS = 64
+WORKER_SLOT = struct.Struct('<qQ')
+WORKER_OFFSET = 1024
+
+# Per-process stats written by the sampler: count, then one row per process
+PROCESS_ROLES = ('master', 'worker')
+PROCESS_COUNT = struct.Struct('<I')
+PROCESS_ROW = struct.Struct('<qIIIddQ')  # pid, role, fds, threads, rss_bytes, cpu, requests
+PROCESS_OFFSET = WORKER_OFFSET + MAX_WORKERS * WORKER_SLOT.size
+
+SEGMENT_ENV = 'GREENCLOUD_METRICS_SEGMENT'
+
+
+def default_segment_path(pid=None):
+    """Get the segment path for a server whose main process is `pid`"""
+    directory = Config.METRICS_SHM_DIR or ('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+    return os.path.join(directory, f'greencloud-metrics-{pid or os.getpid()}')
+
+
+class SharedMetrics:
+    """A small mmap segment written by one sampler and read by every worker
+
+    Writes are guarded by a sequence counter (a seqlock): the writer makes
+    it odd before writing and even afterwards, and readers retry when the
+    counter is odd or changed during their read. Readers never take a lock,
+    and give up after READ_RETRIES so a sampler killed mid-write cannot
+    leave them spinning.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._map = None
+        self._lock_file = None
+
+    def open(self):
+        """Map the segment, creating and initializing it if needed"""
+        if self._map is not None:
+            return self
+        self.path = self.path or os.environ.get(SEGMENT_ENV) or default_segment_path()
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < SEGMENT_SIZE:
+                os.ftruncate(fd, SEGMENT_SIZE)
+            self._map = mmap.mmap(fd, SEGMENT_SIZE)
+        finally:
+            os.close(fd)
+
+        if not self._is_current():
+            self._initialize()
+        return self
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    @property
+    def start_time(self):
+        """Server start time as a UNIX timestamp"""
+        return HEADER.unpack_from(self._map, 0)[3]
+
+    @property
+    def sampler_pid(self):
+        return HEADER.unpack_from(self._map, 0)[4]
+
+    def acquire_sampler(self):
+        """Try to become the single process that samples the host"""
+        if self._lock_file is not None:
+            return True
+        if fcntl is None:
+            return True
+
+        lock_file = open(self.path + '.lock', 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        self._lock_file = lock_file
+        magic, version, sequence, start_time, _ = HEADER.unpack_from(self._map, 0)
+        # A previous sampler may have died mid-write; even the counter out
+        # so our writes leave it even again
+        sequence += sequence % 2
+        HEADER.pack_into(self._map, 0, magic, version, sequence, start_time, os.getpid())
+        return True
+
+    def write_snapshot(self, snapshot):
+        """Publish a sampler snapshot"""
+        values = []
+        for field in SNAPSHOT_FIELDS:
+            value = snapshot
+            for part in field.split('.'):
+                value = value.get(part) if value else None
+            values.append(NONE if value is None else float(value))
+
+        self._begin_write()
+        SNAPSHOT.pack_into(self._map, SNAPSHOT_OFFSET, *values)
+        self._end_write()
+
+    def read_snapshot(self):
+        """Read the latest snapshot, or None if nothing readable was published"""
+        values = self._read(lambda: SNAPSHOT.unpack_from(self._map, SNAPSHOT_OFFSET))
+        if values is None:
+            return None
+        raw = dict(zip(SNAPSHOT_FIELDS, values))
+        if not raw['sampled_at']:
+            return None
+
+        snapshot = {'cpu': raw['cpu'], 'sampled_at': raw['sampled_at'], 'memory': {}, 'disk': {}}
+        for field, value in raw.items():
+            group, _, name = field.partition('.')
+            if group in ('memory', 'disk'):
+                snapshot[group][name] = value
+
+        snapshot['battery'] = None
+        if raw['battery.percent'] != NONE:
+            snapshot['battery'] = {
+                'percent': raw['battery.percent'],
+                'plugged': bool(raw['battery.plugged']),
+                'time_left': None if raw['battery.time_left'] == NONE else raw['battery.time_left']
+            }
+
+        snapshot['volumes'] = {}
+        for volume in VOLUMES:
+            values = {field: raw[f'volumes.{volume}.{field}'] for field in VOLUME_FIELDS}
+            if values['percent'] == NONE:
+                snapshot['volumes'][volume] = None
+            else:
+                snapshot['volumes'][volume] = {field: None if value == NONE else value
+                                               for field, value in values.items()}
+        return snapshot
+
+    def claim_worker_slot(self, pid=None):
+        """Take a worker slot for `pid`, reusing slots of dead processes"""
+        pid = pid or os.getpid()
+        lock_file = open(self.path + '.init', 'a')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            free = None
+            for slot in range(MAX_WORKERS):
+                owner, _ = WORKER_SLOT.unpack_from(self._map, WORKER_OFFSET + slot * WORKER_SLOT.size)
+                if owner == pid:
+                    return slot
+                if free is None and (owner == 0 or not psutil.pid_exists(owner)):
+                    free = slot
+            if free is not None:
+                WORKER_SLOT.pack_into(self._map, WORKER_OFFSET + free * WORKER_SLOT.size, pid, 0)
+            return free
+        finally:
+            lock_file.close()
+
+    def count_request(self, slot):
+        """Add one served request to a worker slot (only its owner calls this)"""
+        offset = WORKER_OFFSET + slot * WORKER_SLOT.size + 8
+        struct.pack_into('<Q', self._map, offset, struct.unpack_from('<Q', self._map, offset)[0] + 1)
+
+    def read_worker_requests(self):
+        """Get requests served keyed by worker pid"""
+        requests = {}
+        for slot in range(MAX_WORKERS):
+            pid, served = WORKER_SLOT.unpack_from(self._map, WORKER_OFFSET + slot * WORKER_SLOT.size)
+            if pid:
+                requests[pid] = served
+        return requests
+
+    def write_processes(self, processes):
+        """Publish per-process stats from the sampler"""
+        processes = processes[:MAX_WORKERS + 1]
+        self._begin_write()
+        PROCESS_COUNT.pack_into(self._map, PROCESS_OFFSET, len(processes))
+        for i, process in enumerate(processes):
+            PROCESS_ROW.pack_into(
+                self._map, PROCESS_OFFSET + PROCESS_COUNT.size + i * PROCESS_ROW.size,
+                process['pid'], PROCESS_ROLES.index(process['role']), process['fds'] or 0,
+                process['threads'], process['rss_bytes'], process['cpu'], process['requests'] or 0
+            )
+        self._end_write()
+
+    def read_processes(self):
+        """Read the per-process stats published by the sampler, or None if unreadable"""
+        def reader():
+            count = PROCESS_COUNT.unpack_from(self._map, PROCESS_OFFSET)[0]
+            return [PROCESS_ROW.unpack_from(self._map, PROCESS_OFFSET + PROCESS_COUNT.size + i * PROCESS_ROW.size)
+                    for i in range(min(count, MAX_WORKERS + 1))]
+
+        rows = self._read(reader)
+        if rows is None:
+            return None
+        return [{
+            'pid': pid,
+            'role': PROCESS_ROLES[role],
+            'fds': fds,
+            'threads': threads,
+            'rss_bytes': rss_bytes,
+            'cpu': cpu,
+            'requests': requests
+        } for pid, role, fds, threads, rss_bytes, cpu, requests in rows]
+
+    def _initialize(self):
+        """Write a fresh header, serialized against other initializers"""
+        lock_file = open(self.path + '.init', 'a')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if not self._is_current():
+                # Missing, or written with an older layout
+                self._map[:SEGMENT_SIZE] = bytes(SEGMENT_SIZE)
+                HEADER.pack_into(self._map, 0, MAGIC, VERSION, 0, time.time(), 0)
+        finally:
+            lock_file.close()
+
+    def _is_current(self):
+        magic, version = HEADER.unpack_from(self._map, 0)[:2]
+        return magic == MAGIC and version == VERSION
+
+    def _sequence(self):
+        return struct.unpack_from('<Q', self._map, 8)[0]
+
+    def _begin_write(self):
+        struct.pack_into('<Q', self._map, 8, self._sequence() + 1)
+
+    def _end_write(self):
+        struct.pack_into('<Q', self._map, 8, self._sequence() + 1)
+
+    def _read(self, reader):
+        """Run `reader` until it sees a consistent copy, or None after READ_RETRIES"""
+        for attempt in range(READ_RETRIES):
+            if attempt:
+                time.sleep(READ_RETRY_DELAY)
+            before = self._sequence()
+            if before % 2:
+                continue
+            result = reader()
+            if self._sequence() == before:
+                return result
+        return None
+
+
+def worker_dir(path=None):
+    """Get the directory where workers drop their metric files"""
+    path = path or os.environ.get(SEGMENT_ENV) or default_segment_path()
+    return path + '.workers'
+
+
+def create_segment(pid=None):
+    """Create a fresh segment for a new server and export its path to children"""
+    path = default_segment_path(pid)
+    for stale in (path, path + '.lock', path + '.init'):
+        if os.path.exists(stale):
+            os.remove(stale)
+    shutil.rmtree(worker_dir(path), ignore_errors=True)
+
+    segment = SharedMetrics(path).open()
+    segment.close()
+    os.environ[SEGMENT_ENV] = path
+    return path
+
+
+def remove_segment(path=None):
+    """Remove a server's segment files"""
+    path = path or os.environ.get(SEGMENT_ENV)
+    if not path:
+        return
+    for leftover in (path, path + '.lock', path + '.init'):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    shutil.rmtree(worker_dir(path), ignore_errors=True)
@@ -0,0 +1,135 @@
+"""Storage analytics - where the space goes"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import func, case
+from extensions import db
+from models.file import File
+from models.folder import Folder
+from services.cache import panel_cache, user_scope, GLOBAL_SCOPE
+
+
+TYPE_FAMILIES = {
+    'Documents': {'pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'txt', 'csv'},
+    'Images': {'jpg', 'jpeg', 'png', 'gif', 'bmp', 'svg'},
+    'Videos': {'mp4', 'avi', 'mov', 'mkv'},
+    'Audio': {'mp3', 'wav', 'flac', 'ogg'},
+    'Archives': {'zip', 'rar', '7z', 'tar'},
+    'Code & Data': {'py', 'js', 'html', 'css', 'java', 'cpp', 'json', 'xml'},
+}
+
+# (upper bound in days, label); None means no upper bound
+AGE_BUCKETS = [
+    (30, 'Last 30 days'),
+    (90, '1-3 months'),
+    (365, '3-12 months'),
+    (None, 'Over a year'),
+]
+
+
+class StorageAnalytics:
+    """Storage breakdowns for one user, or for everyone when user_id is None"""
+
+    def __init__(self, user_id=None):
+        self.user_id = user_id
+        self.scope = user_scope(user_id) if user_id is not None else GLOBAL_SCOPE
+
+    def get_breakdown(self):
+        """Get the cached breakdown, recomputing it after file changes"""
+        return panel_cache.get_or_compute(self.scope, 'storage_breakdown', self._compute_breakdown)
+
+    def get_top_consumers(self, limit=3):
+        """Get the biggest type families and folders"""
+        breakdown = self.get_breakdown()
+        return {
+            'families': breakdown['by_family'][:limit],
+            'folders': breakdown['by_folder'][:limit]
+        }
+
+    def _compute_breakdown(self):
+        """Run the aggregate queries"""
+        by_extension = self._by_extension()
+
+        return {
+            'total_bytes': sum(row['bytes'] for row in by_extension),
+            'total_files': sum(row['count'] for row in by_extension),
+            'trash_bytes': self._trash_bytes(),
+            'by_extension': by_extension,
+            'by_family': self._by_family(by_extension),
+            'by_age': self._by_age(),
+            'by_folder': self._by_folder()
+        }
+
+    def _active_filters(self):
+        filters = [File.is_deleted == False]
+        if self.user_id is not None:
+            filters.append(File.user_id == self.user_id)
+        return filters
+
+    def _by_extension(self):
+        """Bytes and counts grouped by extension"""
+        rows = db.session.query(
+            File.extension,
+            func.count(File.id),
+            func.coalesce(func.sum(File.size), 0)
+        ).filter(*self._active_filters()).group_by(File.extension).all()
+
+        return _ranked((extension or 'other', count, size) for extension, count, size in rows)
+
+    def _by_family(self, by_extension):
+        """Roll extension groups up into type families"""
+        families = {}
+        for row in by_extension:
+            family = next((name for name, extensions in TYPE_FAMILIES.items()
+                           if row['key'] in extensions), 'Other')
+            count, size = families.get(family, (0, 0))
+            families[family] = (count + row['count'], size + row['bytes'])
+
+        return _ranked((family, count, size) for family, (count, size) in families.items())
+
+    def _by_age(self):
+        """Bytes and counts grouped by upload age"""
+        now = datetime.utcnow()
+        bucket = case(
+            *[(File.created_at >= now - timedelta(days=days), index)
+              for index, (days, _) in enumerate(AGE_BUCKETS) if days is not None],
+            else_=len(AGE_BUCKETS) - 1
+        )
+
+        rows = dict((index, (count, size)) for index, count, size in db.session.query(
+            bucket,
+            func.count(File.id),
+            func.coalesce(func.sum(File.size), 0)
+        ).filter(*self._active_filters()).group_by(bucket).all())
+
+        # Keep buckets in age order, including empty ones
+        return [{
+            'key': label,
+            'count': rows.get(index, (0, 0))[0],
+            'bytes': int(rows.get(index, (0, 0))[1])
+        } for index, (_, label) in enumerate(AGE_BUCKETS)]
+
+    def _by_folder(self, limit=10):
+        """Bytes and counts grouped by folder"""
+        rows = db.session.query(
+            Folder.path,
+            Folder.name,
+            func.count(File.id),
+            func.coalesce(func.sum(File.size), 0)
+        ).select_from(File).outerjoin(Folder, File.folder_id == Folder.id).filter(
+            *self._active_filters()
+        ).group_by(File.folder_id, Folder.path, Folder.name).all()
+
+        return _ranked((path or name or 'Root', count, size) for path, name, count, size in rows)[:limit]
+
+    def _trash_bytes(self):
+        """Bytes held in trash"""
+        filters = [File.is_deleted == True]
+        if self.user_id is not None:
+            filters.append(File.user_id == self.user_id)
+        return int(db.session.query(func.coalesce(func.sum(File.size), 0)).filter(*filters).scalar())
+
+
+def _ranked(rows):
+    """Turn (key, count, bytes) tuples into dicts, biggest first"""
+    return sorted(({'key': key, 'count': count, 'bytes': int(size)} for key, count, size in rows),
+                  key=lambda row: row['bytes'], reverse=True)
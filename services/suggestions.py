@@ -0,0 +1,258 @@
+"""Suggestions precomputed for every user by a batch job"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import and_, case, delete, event, func, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from extensions import db
+from models.user import User
+from models.file import File
+from models.user_suggestions import UserSuggestions
+from config import Config
+
+
+# Files not accessed for this long count as old
+OLD_FILE_DAYS = 180
+
+# Columns collect_stats reads; changing any other column keeps the stored row
+USER_STATS_ATTRIBUTES = ('storage_used', 'storage_quota', 'eco_mode_enabled', 'auto_cleanup_enabled')
+FILE_STATS_ATTRIBUTES = ('user_id', 'size', 'file_hash', 'is_deleted', 'deleted_at', 'folder_id')
+
+
+class SuggestionService:
+    """Compute every user's suggestions in a few grouped queries
+
+    One pass groups file counts by user, one groups duplicate hashes by
+    user and one reads user settings, so the cost no longer grows with the
+    number of requests. Request paths read the stored row; users the job
+    has not reached yet, or whose files or settings changed since, get the
+    same passes restricted to them once and the result is stored.
+    """
+
+    def refresh_all(self):
+        """Recompute and store suggestions for every user"""
+        now = datetime.utcnow()
+        rows = [{
+            'user_id': user_id,
+            'greenops': greenops_suggestions(stats),
+            'smart': smart_suggestions(stats),
+            'computed_at': now
+        } for user_id, stats in self.collect_stats().items()]
+
+        # Upsert rather than replace the table, so a read never finds it empty
+        for row in rows:
+            _upsert(row)
+        db.session.commit()
+        return len(rows)
+
+    def invalidate(self, user_ids, connection=None):
+        """Drop stored suggestions so the next read recomputes them"""
+        if user_ids:
+            (connection or db.session).execute(
+                delete(UserSuggestions.__table__).where(UserSuggestions.user_id.in_(user_ids))
+            )
+
+    def get(self, user_id):
+        """Get a user's stored suggestions, computing and storing them when missing"""
+        row = db.session.get(UserSuggestions, user_id)
+        if row is not None:
+            return {'greenops': row.greenops, 'smart': row.smart}
+
+        stats = self.collect_stats([user_id]).get(user_id)
+        if stats is None:
+            return {'greenops': [], 'smart': []}
+        suggestions = {'greenops': greenops_suggestions(stats), 'smart': smart_suggestions(stats)}
+        _upsert({'user_id': user_id, 'computed_at': datetime.utcnow(), **suggestions})
+        db.session.commit()
+        return suggestions
+
+    def collect_stats(self, user_ids=None):
+        """Gather the figures suggestions are based on, per user"""
+        now = datetime.utcnow()
+        trash_cutoff = now - timedelta(days=Config.AUTO_CLEANUP_DAYS)
+        old_cutoff = now - timedelta(days=OLD_FILE_DAYS)
+
+        users = db.session.query(
+            User.id, User.storage_used, User.storage_quota, User.eco_mode_enabled, User.auto_cleanup_enabled
+        )
+        if user_ids is not None:
+            users = users.filter(User.id.in_(user_ids))
+
+        stats = {}
+        for user_id, used, quota, eco_mode, auto_cleanup in users:
+            stats[user_id] = {
+                'storage_percentage': (used or 0) / quota * 100 if quota else 0,
+                'eco_mode': eco_mode,
+                'auto_cleanup': auto_cleanup,
+                'file_count': 0,
+                'trash_count': 0,
+                'old_trash_count': 0,
+                'unfiled_count': 0,
+                'old_file_count': 0,
+                'duplicate_groups': 0,
+                'duplicate_bytes': 0
+            }
+
+        active = File.is_deleted == False
+        trash = File.is_deleted == True
+        files = db.session.query(
+            File.user_id,
+            _count_where(active),
+            _count_where(trash),
+            _count_where(trash, File.deleted_at < trash_cutoff),
+            _count_where(active, File.folder_id == None),
+            _count_where(active, File.last_accessed < old_cutoff)
+        )
+        if user_ids is not None:
+            files = files.filter(File.user_id.in_(user_ids))
+
+        for user_id, *counts in files.group_by(File.user_id):
+            if user_id in stats:
+                stats[user_id].update(zip(
+                    ('file_count', 'trash_count', 'old_trash_count', 'unfiled_count', 'old_file_count'),
+                    (int(count) for count in counts)
+                ))
+
+        groups = db.session.query(
+            File.user_id, func.sum(File.size).label('size')
+        ).filter(active, File.file_hash != None)
+        if user_ids is not None:
+            groups = groups.filter(File.user_id.in_(user_ids))
+        groups = groups.group_by(File.user_id, File.file_hash).having(func.count(File.id) > 1).subquery()
+
+        for user_id, count, size in db.session.query(
+            groups.c.user_id, func.count(), func.coalesce(func.sum(groups.c.size), 0)
+        ).group_by(groups.c.user_id):
+            if user_id in stats:
+                stats[user_id]['duplicate_groups'] = count
+                stats[user_id]['duplicate_bytes'] = int(size)
+
+        return stats
+
+
+def greenops_suggestions(stats):
+    """Optimization suggestions shown on the dashboards"""
+    suggestions = []
+
+    # Storage suggestions
+    percentage = stats['storage_percentage']
+    if percentage > 90:
+        suggestions.append("Critical: Storage almost full. Delete unused files immediately.")
+    elif percentage > 70:
+        suggestions.append("Warning: Storage usage is high. Consider cleanup.")
+
+    # Trash suggestions
+    if stats['old_trash_count'] > 0:
+        suggestions.append(f"Empty {stats['old_trash_count']} old files from trash to free up space.")
+
+    # Duplicate suggestions
+    if stats['duplicate_groups'] > 0:
+        waste_mb = stats['duplicate_bytes'] / (1024**2)
+        suggestions.append(f"Remove {stats['duplicate_groups']} duplicate file groups to save {waste_mb:.1f} MB.")
+
+    # Organization suggestions
+    if stats['unfiled_count'] > 10:
+        suggestions.append(f"Organize {stats['unfiled_count']} files into folders for better management.")
+
+    # Eco mode suggestion
+    if not stats['eco_mode']:
+        suggestions.append("Enable Eco Mode to activate energy-saving features.")
+
+    # Auto cleanup suggestion
+    if not stats['auto_cleanup']:
+        suggestions.append("Enable Auto Cleanup to automatically remove old trash files.")
+
+    # Old files suggestion
+    if stats['old_file_count'] > 5:
+        suggestions.append(f"Archive or delete {stats['old_file_count']} files not accessed in 6 months.")
+
+    return suggestions
+
+
+def smart_suggestions(stats):
+    """Short suggestions offered by the AI agent"""
+    suggestions = []
+
+    if stats['storage_percentage'] > 80:
+        suggestions.append("Your storage is getting full. Consider cleaning up old files.")
+
+    if stats['trash_count'] > 10:
+        suggestions.append(f"You have {stats['trash_count']} files in trash. Empty it to free up space.")
+
+    if stats['duplicate_groups'] > 0:
+        suggestions.append(f"Found {stats['duplicate_groups']} duplicate file groups. Review them to save space.")
+
+    if stats['unfiled_count'] > 5:
+        suggestions.append("You have files without folders. Organize them for better management.")
+
+    return suggestions
+
+
+def _upsert(row):
+    """Insert or update one user's stored suggestions"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in ('sqlite', 'postgresql'):
+        db.session.merge(UserSuggestions(**row))
+        return
+
+    insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+    statement = insert(UserSuggestions.__table__).values(**row)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[UserSuggestions.user_id],
+        set_={key: statement.excluded[key] for key in row if key != 'user_id'}
+    ))
+
+
+def _invalidate_flushed(session, flush_context):
+    """Drop the stored suggestions of users whose stats are being changed
+
+    Runs inside the flush, so the delete commits or rolls back with the change.
+    Logins and downloads only touch timestamps and usually keep the row.
+    """
+    user_ids = set()
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, User):
+            user_ids.add(obj.id)
+        elif isinstance(obj, File):
+            user_ids.add(obj.user_id)
+
+    for obj in session.dirty:
+        if isinstance(obj, User) and _stats_changed(obj, USER_STATS_ATTRIBUTES):
+            user_ids.add(obj.id)
+        elif isinstance(obj, File) and (_stats_changed(obj, FILE_STATS_ATTRIBUTES) or _age_changed(obj)):
+            # A file moved to another user changes both users' stats
+            user_ids.update(inspect(obj).attrs.user_id.history.deleted)
+            user_ids.add(obj.user_id)
+
+    user_ids.discard(None)
+    suggestion_service.invalidate(user_ids, session.connection())
+
+
+def _stats_changed(obj, attributes):
+    state = inspect(obj)
+    return any(state.attrs[key].history.has_changes() for key in attributes)
+
+
+def _age_changed(file):
+    """Check whether a new last_accessed moves a file across the OLD_FILE_DAYS boundary"""
+    history = inspect(file).attrs.last_accessed.history
+    if not history.has_changes():
+        return False
+    if not history.deleted:
+        # The previous value was never loaded
+        return True
+    cutoff = datetime.utcnow() - timedelta(days=OLD_FILE_DAYS)
+    was_old, is_old = (value is not None and value < cutoff for value in (history.deleted[0], file.last_accessed))
+    return was_old != is_old
+
+
+def _count_where(*conditions):
+    """Count the rows of a group matching all conditions"""
+    return func.coalesce(func.sum(case((and_(*conditions), 1), else_=0)), 0)
+
+
+event.listen(Session, 'after_flush', _invalidate_flushed)
+
+
+# Global instance
+suggestion_service = SuggestionService()
@@ -1,39 +1,353 @@
 """System monitoring service for GreenOps"""
 
+import atexit
+import os
 import psutil
+import threading
 import time
+from collections import deque
 from datetime import datetime, timedelta
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import ArgumentError
+from config import Config
+from services.metrics_history import metrics_history
+from services.shared_metrics import SharedMetrics, SEGMENT_ENV, VOLUMES, create_segment, remove_segment
 
 
 class SystemMonitor:
-    """Monitor laptop/server resources for GreenOps"""
+    """Monitor laptop/server resources for GreenOps
     
-    def __init__(self):
+    One process per server (the first worker to take the sampler lock)
+    samples the host every METRICS_SAMPLE_INTERVAL seconds and publishes
+    the snapshot to a shared-memory segment. Every worker reads that
+    segment lock-free, so all of them report the same values and uptime
+    and the sampling cost does not grow with the number of workers.
+    
+    Each worker also counts the requests it serves in its own slot of the
+    segment, and the sampler publishes per-process RSS, CPU, open files
+    and threads for the server's master and workers.
+    
+    Disk figures describe the volumes holding the uploads and the SQLite
+    database rather than '/', with I/O rates from disk_io_counters deltas
+    and a time-to-full projected from recent growth.
+    """
+    
+    def __init__(self, interval=None):
         self.start_time = datetime.utcnow()
+        self.interval = interval or Config.METRICS_SAMPLE_INTERVAL
+        self.segment = None
+        self.is_sampler = False
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._updated = threading.Condition()
+        self.owns_segment = False
+        self.worker_slot = None
+        self._processes = []
+        self._process_handles = {}
+        self._count_lock = threading.Lock()
+        self._volumes = None
+        self._io_previous = {}
+        self._growth = {name: deque() for name in VOLUMES}
+    
+    def init_app(self, app):
+        """Count the requests served by this worker"""
+        app.teardown_request(self._count_request)
+    
+    def start(self):
+        """Attach to the shared segment and start the background thread"""
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            # A forked worker inherits state but not the thread or the lock
+            self.is_sampler = False
+            self._attach_segment()
+            self.worker_slot = self.segment.claim_worker_slot()
+            
+            snapshot = self._refresh()
+            if snapshot is None:
+                # The sampler has not published yet; take one local reading
+                snapshot = self.sample(prime=True)
+            self._snapshot = snapshot
+            metrics_history.record(snapshot)
+            
+            self._thread = threading.Thread(target=self._run, name='greencloud-sampler', daemon=True)
+            self._thread.start()
+            # Set last: other request threads skip start() once the pid matches
+            self._pid = os.getpid()
+    
+    def sample(self, prime=False):
+        """Collect one snapshot of host resources"""
+        # cpu_percent(None) measures since the previous call; the very first
+        # call has nothing to compare against, so take a short blocking read
+        cpu = psutil.cpu_percent(interval=0.1 if prime else None)
+        memory = psutil.virtual_memory()
+        volumes = self.sample_volumes()
+        disk = volumes['uploads']
+        
+        return {
+            'cpu': cpu,
+            'memory': {
+                'percent': memory.percent,
+                'used_gb': memory.used / (1024**3),
+                'total_gb': memory.total / (1024**3),
+                'available_gb': memory.available / (1024**3)
+            },
+            'disk': {
+                'percent': disk['percent'],
+                'used_gb': disk['used_gb'],
+                'total_gb': disk['total_gb'],
+                'free_gb': disk['free_gb']
+            },
+            'volumes': volumes,
+            'battery': self._read_battery(),
+            'sampled_at': time.time()
+        }
+    
+    def sample_volumes(self):
+        """Collect capacity, I/O rates and growth of the upload and database volumes"""
+        if self._volumes is None:
+            self._volumes = self._resolve_volumes()
+        
+        now = time.time()
+        try:
+            counters = psutil.disk_io_counters(perdisk=True) or {}
+        except (RuntimeError, OSError):
+            counters = {}
+        
+        volumes = {}
+        for name in VOLUMES:
+            volume = self._volumes.get(name)
+            if volume is None:
+                volumes[name] = None
+                continue
+            
+            usage = psutil.disk_usage(volume['path'])
+            stats = {
+                'percent': usage.percent,
+                'used_gb': usage.used / (1024**3),
+                'total_gb': usage.total / (1024**3),
+                'free_gb': usage.free / (1024**3),
+                'time_to_full': self._time_to_full(name, now, usage)
+            }
+            stats.update(self._io_rates(name, now, counters.get(volume['device'])))
+            volumes[name] = stats
+        return volumes
+    
+    def _resolve_volumes(self):
+        """Find the mount point and block device behind each app volume"""
+        paths = {'uploads': Config.UPLOAD_FOLDER, 'database': _sqlite_path()}
+        partitions = psutil.disk_partitions(all=True)
+        
+        volumes = {}
+        for name, path in paths.items():
+            if not path:
+                volumes[name] = None
+                continue
+            path = _existing_parent(path)
+            
+            # The longest matching mount point wins; later mounts shadow earlier ones
+            mount = None
+            for partition in partitions:
+                prefix = partition.mountpoint.rstrip(os.sep) + os.sep
+                if path == partition.mountpoint or path.startswith(prefix):
+                    if mount is None or len(partition.mountpoint) >= len(mount.mountpoint):
+                        mount = partition
+            
+            device = None
+            if mount is not None and mount.device.startswith('/dev/'):
+                # /dev/mapper/* links resolve to the dm-N name used by the kernel counters
+                device = os.path.basename(os.path.realpath(mount.device))
+            volumes[name] = {
+                'path': path,
+                'mountpoint': mount.mountpoint if mount else None,
+                'device': device
+            }
+        return volumes
+    
+    def _io_rates(self, name, now, counters):
+        """Throughput, IOPS and average latency since the previous sample"""
+        previous = self._io_previous.get(name)
+        self._io_previous[name] = (now, counters) if counters else None
+        rates = dict.fromkeys(('read_bps', 'write_bps', 'read_iops', 'write_iops', 'latency_ms'))
+        if not previous or not counters or now <= previous[0]:
+            return rates
+        
+        elapsed = now - previous[0]
+        before = previous[1]
+        reads = counters.read_count - before.read_count
+        writes = counters.write_count - before.write_count
+        busy_ms = (counters.read_time - before.read_time) + (counters.write_time - before.write_time)
+        
+        rates['read_bps'] = (counters.read_bytes - before.read_bytes) / elapsed
+        rates['write_bps'] = (counters.write_bytes - before.write_bytes) / elapsed
+        rates['read_iops'] = reads / elapsed
+        rates['write_iops'] = writes / elapsed
+        rates['latency_ms'] = busy_ms / (reads + writes) if reads + writes else 0.0
+        return rates
+    
+    def _time_to_full(self, name, now, usage):
+        """Seconds until the volume fills at its recent growth rate, or None"""
+        growth = self._growth[name]
+        growth.append((now, usage.used))
+        while growth and growth[0][0] < now - Config.DISK_GROWTH_WINDOW_MINUTES * 60:
+            growth.popleft()
+        if len(growth) < 3 or growth[-1][0] - growth[0][0] < 60:
+            return None
+        
+        # Least-squares slope in bytes per second
+        count = len(growth)
+        mean_t = sum(t for t, _ in growth) / count
+        mean_used = sum(used for _, used in growth) / count
+        spread = sum((t - mean_t) ** 2 for t, _ in growth)
+        slope = sum((t - mean_t) * (used - mean_used) for t, used in growth) / spread
+        if slope <= 0:
+            return None
+        return usage.free / slope
+    
+    def sample_processes(self):
+        """Collect stats for the server's master and worker processes"""
+        current = psutil.Process()
+        if self.owns_segment:
+            # Single-process server (flask run, python app.py)
+            members = [(current, 'worker')]
+        else:
+            master = current.parent()
+            members = [(master, 'master')] + [(child, 'worker') for child in master.children()]
+        
+        requests = self.segment.read_worker_requests()
+        handles, processes = {}, []
+        for process, role in members:
+            # Reuse handles so cpu_percent() measures since the last sample
+            process = self._process_handles.get(process.pid, process)
+            try:
+                with process.oneshot():
+                    processes.append({
+                        'pid': process.pid,
+                        'role': role,
+                        'rss_bytes': process.memory_info().rss,
+                        'cpu': process.cpu_percent(None),
+                        'fds': process.num_fds() if hasattr(process, 'num_fds') else None,
+                        'threads': process.num_threads(),
+                        'requests': requests.get(process.pid)
+                    })
+            except psutil.Error:
+                continue
+            handles[process.pid] = process
+        
+        self._process_handles = handles
+        return processes
+    
+    def get_process_breakdown(self):
+        """Get resource usage of each server process, master first"""
+        self.get_snapshot()
+        processes = None
+        if self.segment is not None and not self.is_sampler:
+            processes = self.segment.read_processes()
+        if processes is None:
+            processes = self._processes
+        
+        return [{
+            'pid': process['pid'],
+            'role': process['role'],
+            'rss_bytes': int(process['rss_bytes']),
+            'rss_mb': round(process['rss_bytes'] / (1024**2), 1),
+            'cpu': round(process['cpu'], 1),
+            'fds': process['fds'],
+            'threads': process['threads'],
+            'requests': process['requests'] or 0
+        } for process in sorted(processes, key=lambda p: (p['role'] != 'master', p['pid']))]
+    
+    def get_snapshot(self):
+        """Get the latest snapshot, starting the sampler on first use"""
+        if self._pid != os.getpid():
+            self.start()
+        if self.segment is not None and not self.is_sampler:
+            return self.segment.read_snapshot() or self._snapshot
+        return self._snapshot
+    
+    def wait_for_update(self, sampled_at, timeout):
+        """Block until a snapshot newer than `sampled_at` exists or timeout"""
+        snapshot = self.get_snapshot()
+        if sampled_at is None or snapshot['sampled_at'] > sampled_at:
+            return snapshot
+        with self._updated:
+            self._updated.wait(timeout)
+        return self.get_snapshot()
+    
+    def _attach_segment(self):
+        """Open the shared segment, creating a private one outside gunicorn"""
+        if self.segment is None:
+            if not os.environ.get(SEGMENT_ENV):
+                # Single-process server: this process owns the segment
+                path = create_segment()
+                atexit.register(remove_segment, path)
+                self.owns_segment = True
+            self.segment = SharedMetrics().open()
+        self.start_time = datetime.utcfromtimestamp(self.segment.start_time)
+    
+    def _refresh(self):
+        """Sample if this process is the sampler, otherwise read the segment"""
+        if not self.is_sampler:
+            self.is_sampler = self.segment.acquire_sampler()
+            if self.is_sampler and self._snapshot is None:
+                snapshot = self.sample(prime=True)
+                self.segment.write_snapshot(snapshot)
+                self._publish_processes()
+                return snapshot
+        
+        if self.is_sampler:
+            snapshot = self.sample()
+            self.segment.write_snapshot(snapshot)
+            self._publish_processes()
+            return snapshot
+        return self.segment.read_snapshot()
+    
+    def _publish_processes(self):
+        try:
+            self._processes = self.sample_processes()
+            self.segment.write_processes(self._processes)
+        except psutil.Error as e:
+            print(f"Process sampling error: {e}")
+    
+    def _count_request(self, exc=None):
+        """Add the finished request to this worker's slot"""
+        if self._pid != os.getpid():
+            self.start()
+        if self.worker_slot is not None:
+            with self._count_lock:
+                self.segment.count_request(self.worker_slot)
+    
+    def _run(self):
+        """Background loop: sample or follow, and feed the local history"""
+        while True:
+            time.sleep(self.interval)
+            try:
+                snapshot = self._refresh()
+                if snapshot and (self._snapshot is None or snapshot['sampled_at'] > self._snapshot['sampled_at']):
+                    self._snapshot = snapshot
+                    metrics_history.record(snapshot)
+                    with self._updated:
+                        self._updated.notify_all()
+            except Exception as e:
+                print(f"System sampler error: {e}")
     
     def get_cpu_usage(self):
         """Get current CPU usage percentage"""
-        return psutil.cpu_percent(interval=1)
+        return self.get_snapshot()['cpu']
     
     def get_memory_usage(self):
         """Get memory usage information"""
-        memory = psutil.virtual_memory()
-        return {
-            'percent': memory.percent,
-            'used_gb': memory.used / (1024**3),
-            'total_gb': memory.total / (1024**3),
-            'available_gb': memory.available / (1024**3)
-        }
+        return self.get_snapshot()['memory']
     
     def get_disk_usage(self):
         """Get disk usage information"""
-        disk = psutil.disk_usage('/')
-        return {
-            'percent': disk.percent,
-            'used_gb': disk.used / (1024**3),
-            'total_gb': disk.total / (1024**3),
-            'free_gb': disk.free / (1024**3)
-        }
+        return self.get_snapshot()['disk']
+    
+    def get_volumes(self):
+        """Get capacity, I/O and time-to-full of the upload and database volumes"""
+        return self.get_snapshot()['volumes']
     
     def get_server_uptime(self):
         """Get server running time"""
@@ -61,6 +375,10 @@ class SystemMonitor:
     
     def get_battery_info(self):
         """Get battery status if available"""
+        return self.get_snapshot()['battery']
+    
+    def _read_battery(self):
+        """Read battery status from the host"""
         try:
             battery = psutil.sensors_battery()
             if battery:
@@ -80,6 +398,7 @@ class SystemMonitor:
         cpu = self.get_cpu_usage()
         if cpu > 80:
             alerts.append({
+                'key': 'cpu',
                 'type': 'warning',
                 'message': f'High CPU usage detected ({cpu:.1f}%)'
             })
@@ -87,6 +406,7 @@ class SystemMonitor:
         memory = self.get_memory_usage()
         if memory['percent'] > 85:
             alerts.append({
+                'key': 'memory',
                 'type': 'warning',
                 'message': f'High memory usage ({memory["percent"]:.1f}%)'
             })
@@ -94,14 +414,26 @@ class SystemMonitor:
         disk = self.get_disk_usage()
         if disk['percent'] > 80:
             alerts.append({
+                'key': 'disk',
                 'type': 'danger',
                 'message': f'Storage almost full ({disk["percent"]:.1f}%)'
             })
         
+        for name, volume in self.get_volumes().items():
+            time_to_full = volume and volume['time_to_full']
+            if time_to_full and time_to_full < Config.DISK_FULL_ALERT_HOURS * 3600:
+                alerts.append({
+                    'key': f'{name}_filling',
+                    'type': 'danger',
+                    'message': f'{name.capitalize()} volume will be full in about '
+                               f'{self._format_uptime(timedelta(seconds=int(time_to_full)))} at the current growth rate'
+                })
+        
         # Check battery
         battery = self.get_battery_info()
         if battery and not battery['plugged'] and battery['percent'] < 20:
             alerts.append({
+                'key': 'battery',
                 'type': 'warning',
                 'message': 'Low battery - Enable Eco Mode to save power'
             })
@@ -147,6 +479,7 @@ class SystemMonitor:
                 'free_gb': round(disk['free_gb'], 2),
                 'status': self._get_status_color(disk['percent'])
             },
+            'volumes': {name: self._summarize_volume(volume) for name, volume in self.get_volumes().items()},
             'uptime': uptime,
             'energy_level': energy_level,
             'energy_message': energy_message,
@@ -155,6 +488,27 @@ class SystemMonitor:
             'timestamp': datetime.utcnow().isoformat()
         }
     
+    def _summarize_volume(self, volume):
+        """Round a volume's figures for display"""
+        if volume is None:
+            return None
+        
+        def rounded(value, digits=1):
+            return None if value is None else round(value, digits)
+        
+        time_to_full = volume['time_to_full']
+        return {
+            'percent': volume['percent'],
+            'used_gb': round(volume['used_gb'], 2),
+            'total_gb': round(volume['total_gb'], 2),
+            'read_mbps': rounded(volume['read_bps'] and volume['read_bps'] / (1024**2), 2),
+            'write_mbps': rounded(volume['write_bps'] and volume['write_bps'] / (1024**2), 2),
+            'iops': rounded(volume['read_iops'] + volume['write_iops']) if volume['read_iops'] is not None else None,
+            'latency_ms': rounded(volume['latency_ms'], 2),
+            'time_to_full': self._format_uptime(timedelta(seconds=int(time_to_full))) if time_to_full else None,
+            'status': self._get_status_color(volume['percent'])
+        }
+    
     def calculate_energy_score(self, user_stats):
         """Calculate energy efficiency score (0-100)"""
         score = 100
@@ -276,5 +630,24 @@ class SystemMonitor:
         return recommendations
 
 
+def _sqlite_path():
+    """Get the SQLite database file, or None for a server database"""
+    try:
+        url = make_url(Config.SQLALCHEMY_DATABASE_URI)
+    except ArgumentError:
+        return None
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return None
+    return os.path.abspath(url.database)
+
+
+def _existing_parent(path):
+    """Walk up to the nearest path that exists"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return os.path.realpath(path)
+
+
 # Global instance
 system_monitor = SystemMonitor()
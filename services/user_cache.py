@@ -0,0 +1,71 @@
+"""Per-worker cache of logged in users"""
+
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from extensions import db
+from models.user import User
+from services.cache import panel_cache, user_scope
+from config import Config
+
+
+class UserCache:
+    """LRU cache of user rows for the login manager's user loader
+
+    Entries are stored with the generation of the user's panel cache scope,
+    which every committed change to the user row (or their files) bumps, so
+    a change made by any worker is seen by all of them on the next request.
+    USER_CACHE_TTL only bounds how long an entry lives. Hits are attached
+    to the request's session without a query.
+    """
+
+    def __init__(self, size=None, ttl=None):
+        self.size = size or Config.USER_CACHE_SIZE
+        self.ttl = ttl or Config.USER_CACHE_TTL
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, user_id):
+        """Get a user for the current request, or None"""
+        # Read before loading: a change committed meanwhile leaves the entry stale
+        generation = panel_cache.generation(user_scope(user_id))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry['generation'] == generation and entry['expires'] > now:
+                self._entries.move_to_end(user_id)
+                return _attach(entry['columns'])
+
+        user = db.session.get(User, user_id)
+        if user is not None:
+            columns = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+            with self._lock:
+                self._entries[user_id] = {'generation': generation, 'expires': now + self.ttl, 'columns': columns}
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, *user_ids):
+        """Drop users from every worker, for changes made without the session events
+
+        Changes flushed through the session already bump the user's scope
+        in the panel cache; bulk UPDATE statements do not.
+        """
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+        panel_cache.invalidate(*[user_scope(user_id) for user_id in user_ids])
+
+
+def _attach(columns):
+    """Rebuild a user from cached columns and attach it without a SELECT"""
+    user = User(**columns)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+# Global instance
+user_cache = UserCache()
@@ -2,10 +2,6 @@
 
 echo "Starting GreenCloud application..."
 
-# Initialize database
-echo "Initializing database..."
-python init_db.py
-
-# Start the application
+# Start the application (gunicorn_config.py initializes the database first)
 echo "Starting Gunicorn server..."
 gunicorn app:app --config gunicorn_config.py
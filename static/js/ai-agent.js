@@ -54,24 +54,30 @@ document.addEventListener('DOMContentLoaded', function() {
         // Show typing indicator
         showTypingIndicator();
         
-        // Send to server
+        // Send to server; sections are shown as soon as they arrive
         fetch('/ai/chat', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'Accept': 'application/x-ndjson, application/json;q=0.9'
             },
             body: JSON.stringify({ message: message })
         })
-        .then(response => response.json())
-        .then(data => {
-            // Remove typing indicator
-            removeTypingIndicator();
-            
-            // Add AI response
-            addMessage(data.response, 'ai');
-            
-            // Scroll to bottom
-            scrollToBottom();
+        .then(response => {
+            const type = response.headers.get('Content-Type') || '';
+            if (response.ok && response.body && type.startsWith('application/x-ndjson')) {
+                return readStream(response.body.getReader());
+            }
+            return response.json().then(data => {
+                // Remove typing indicator
+                removeTypingIndicator();
+                
+                // Add AI response
+                addMessage(data.response || data.error, 'ai');
+                
+                // Scroll to bottom
+                scrollToBottom();
+            });
         })
         .catch(error => {
             removeTypingIndicator();
@@ -80,6 +86,50 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    function readStream(reader) {
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        let messageDiv = null;
+        
+        function showSection(section) {
+            text += section;
+            if (!messageDiv) {
+                removeTypingIndicator();
+                messageDiv = addMessage(text, 'ai');
+            } else {
+                messageDiv.querySelector('.ai-text').innerHTML = formatMessage(text);
+                scrollToBottom();
+            }
+        }
+        
+        function read() {
+            return reader.read().then(({ done, value }) => {
+                buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+                const lines = buffer.split('\n');
+                buffer = done ? '' : lines.pop();
+                
+                lines.filter(line => line.trim()).forEach(line => {
+                    const item = JSON.parse(line);
+                    if (item.section !== undefined) {
+                        showSection(item.section);
+                    }
+                });
+                
+                if (done) {
+                    removeTypingIndicator();
+                    if (!messageDiv) {
+                        addMessage('Sorry, I encountered an error. Please try again.', 'ai');
+                    }
+                    return;
+                }
+                return read();
+            });
+        }
+        
+        return read();
+    }
+    
     function addMessage(text, sender) {
         const messageDiv = document.createElement('div');
         messageDiv.className = sender === 'ai' ? 'ai-message' : 'user-message';
@@ -98,6 +148,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         aiChatMessages.appendChild(messageDiv);
         scrollToBottom();
+        return messageDiv;
     }
     
     function showTypingIndicator() {